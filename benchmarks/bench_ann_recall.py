@@ -0,0 +1,98 @@
+"""Recall@k versus latency of ANN search against exact search.
+
+Query vectors are sampled from blog_embedding_oai_small. Exact top-k is
+computed with index scans disabled, then each hnsw.ef_search (or
+ivfflat.probes) value is swept and compared against it:
+
+    python -m benchmarks.bench_ann_recall --database-url postgres://... --method hnsw \\
+        --values 10,20,40,80,160,320 --k 5 --samples 200 --output ann.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List, Set
+
+import asyncpg
+import numpy as np
+
+from database.connection import init_connection
+
+SEARCH_SQL = """
+    SELECT ctid::text AS row_id
+    FROM blog_embedding_oai_small
+    ORDER BY embedding <=> $1::vector
+    LIMIT $2
+"""
+
+
+async def search(conn: asyncpg.Connection, embedding, k: int, setting: str) -> Set[str]:
+    async with conn.transaction():
+        await conn.execute(setting)
+        rows = await conn.fetch(SEARCH_SQL, embedding, k)
+    return {row["row_id"] for row in rows}
+
+
+def percentile_ms(values: List[float], q: float) -> float:
+    return round(float(np.percentile(np.asarray(values) * 1000, q)), 2)
+
+
+async def main(args: argparse.Namespace) -> dict:
+    conn = await asyncpg.connect(args.database_url or os.getenv("DATABASE_URL"))
+    await init_connection(conn)
+    try:
+        rows = await conn.fetch(
+            "SELECT embedding FROM blog_embedding_oai_small ORDER BY random() LIMIT $1", args.samples
+        )
+        queries = [row["embedding"] for row in rows]
+
+        exact, exact_latency = [], []
+        for embedding in queries:
+            started = time.perf_counter()
+            exact.append(await search(conn, embedding, args.k, "SET LOCAL enable_indexscan = off"))
+            exact_latency.append(time.perf_counter() - started)
+        results = {
+            "samples": len(queries),
+            "k": args.k,
+            "method": args.method,
+            "exact": {"p50_ms": percentile_ms(exact_latency, 50), "p95_ms": percentile_ms(exact_latency, 95)},
+            "sweep": [],
+        }
+        print(f"exact              p50 {results['exact']['p50_ms']:8.2f}ms  p95 {results['exact']['p95_ms']:8.2f}ms")
+
+        knob = "hnsw.ef_search" if args.method == "hnsw" else "ivfflat.probes"
+        for value in (int(v) for v in args.values.split(",")):
+            recalls, latency = [], []
+            for embedding, truth in zip(queries, exact):
+                started = time.perf_counter()
+                found = await search(conn, embedding, args.k, f"SET LOCAL {knob} = {value}")
+                latency.append(time.perf_counter() - started)
+                recalls.append(len(found & truth) / max(1, len(truth)))
+            entry = {
+                knob: value,
+                "recall": round(float(np.mean(recalls)), 4),
+                "p50_ms": percentile_ms(latency, 50),
+                "p95_ms": percentile_ms(latency, 95),
+            }
+            results["sweep"].append(entry)
+            print(f"{knob}={value:<5} recall@{args.k} {entry['recall']:.4f}  "
+                  f"p50 {entry['p50_ms']:8.2f}ms  p95 {entry['p95_ms']:8.2f}ms")
+        return results
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url")
+    parser.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--values", default="10,20,40,80,160,320", help="ef_search or probes values to sweep")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,88 @@
+"""Prompt-size reduction from the context packer.
+
+Compares the old ``f"Question: {query}\\n\\nContext: {context}"`` user
+message (the repr of the Context models) with build_user_message. With
+--database-url, query vectors are sampled from blog_embedding_oai_small
+itself and contexts come from perform_similarity_search, so the numbers
+reflect the real corpus; otherwise the synthetic benchmark corpus is used.
+Token counts use tiktoken when installed, else the packer's estimate.
+
+    python -m benchmarks.bench_context_packer --database-url postgres://... --samples 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Callable, List
+
+from models.search import Context
+from services.context_packer import build_user_message, estimate_tokens
+
+
+def token_counter() -> Callable[[str], int]:
+    try:
+        import tiktoken
+    except ImportError:
+        return estimate_tokens
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text))
+
+
+async def contexts_from_database(url: str, samples: int, limit: int) -> List[List[Context]]:
+    import asyncpg
+    from database.connection import init_connection
+    from database.queries import perform_similarity_search
+
+    conn = await asyncpg.connect(url)
+    try:
+        await init_connection(conn)
+        rows = await conn.fetch(
+            "SELECT embedding FROM blog_embedding_oai_small ORDER BY random() LIMIT $1", samples
+        )
+        return [await perform_similarity_search(conn, row["embedding"], limit) for row in rows]
+    finally:
+        await conn.close()
+
+
+async def contexts_from_memory(samples: int, limit: int) -> List[List[Context]]:
+    from benchmarks.memory_store import InMemoryVectorStore
+
+    store = InMemoryVectorStore(corpus_size=2000, latency=0)
+    conn = await store.acquire()
+    results = []
+    for i in range(samples):
+        rows = await conn.fetch("", store.embeddings[(i * 37) % len(store.embeddings)], limit)
+        results.append([Context(**row) for row in rows])
+    return results
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.database_url:
+        contexts = await contexts_from_database(args.database_url, args.samples, args.limit)
+    else:
+        contexts = await contexts_from_memory(args.samples, args.limit)
+    count = token_counter()
+    query = "Which plywood should I use for kitchen cabinets that get wet?"
+
+    before, after, pack_us = [], [], []
+    for context in contexts:
+        before.append(count(f"Question: {query}\n\nContext: {context}"))
+        started = time.perf_counter()
+        message = build_user_message(query, context)
+        pack_us.append((time.perf_counter() - started) * 1e6)
+        after.append(count(message))
+
+    mean_before, mean_after = statistics.mean(before), statistics.mean(after)
+    print(f"samples={len(contexts)} top-k={args.limit}")
+    print(f"repr prompt   mean {mean_before:8.1f} tokens  max {max(before)}")
+    print(f"packed prompt mean {mean_after:8.1f} tokens  max {max(after)}")
+    print(f"reduction     {(1 - mean_after / mean_before) * 100:.1f}%")
+    print(f"packing cost  {statistics.mean(pack_us):.1f} us/prompt")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url")
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,120 @@
+"""Index size, latency and recall@k of quantized two-stage search.
+
+Compares each SEARCH_MODE from database.quantization with the current
+full-vector search. Ground truth is exact top-k with index scans
+disabled. Build the indexes first, e.g.
+
+    python -m database.ann_index create --method hnsw
+    python -m database.ann_index create --method hnsw --quantization halfvec
+    python -m database.ann_index create --method hnsw --quantization subvector
+    python -m database.ann_index create --method hnsw --quantization binary
+
+    python -m benchmarks.bench_quantized_search --database-url postgres://... \\
+        --modes exact,halfvec,subvector,binary --candidates 40 --k 5 --samples 200 --output quantized.json
+
+Set SEARCH_REDUCED_DIMENSIONS to the value the subvector index was built
+with. Modes whose index is missing are still timed (as a sequential scan)
+and reported with a null index size.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List, Optional, Set
+
+import asyncpg
+import numpy as np
+
+from database.ann_index import index_name
+from database.connection import init_connection
+from database.queries import _similarity_query
+
+
+async def search(conn: asyncpg.Connection, sql: str, embedding, k: int, extra: tuple, setting: str) -> Set[str]:
+    async with conn.transaction():
+        await conn.execute(setting)
+        rows = await conn.fetch(sql, embedding, k, *extra)
+    return {f"{row['documentid']}\0{row['content']}" for row in rows}
+
+
+async def index_size(conn: asyncpg.Connection, name: str) -> Optional[int]:
+    return await conn.fetchval("SELECT pg_relation_size(to_regclass($1))", name)
+
+
+def percentile_ms(values: List[float], q: float) -> float:
+    return round(float(np.percentile(np.asarray(values) * 1000, q)), 2)
+
+
+async def main(args: argparse.Namespace) -> dict:
+    os.environ["SEARCH_RERANK_CANDIDATES"] = str(args.candidates)
+    conn = await asyncpg.connect(args.database_url or os.getenv("DATABASE_URL"))
+    await init_connection(conn)
+    try:
+        rows = await conn.fetch(
+            "SELECT embedding FROM blog_embedding_oai_small ORDER BY random() LIMIT $1", args.samples
+        )
+        queries = [row["embedding"] for row in rows]
+
+        exact_sql, _ = _similarity_query("exact", args.k)
+        truth, truth_latency = [], []
+        for embedding in queries:
+            started = time.perf_counter()
+            truth.append(await search(conn, exact_sql, embedding, args.k, (), "SET LOCAL enable_indexscan = off"))
+            truth_latency.append(time.perf_counter() - started)
+        results = {
+            "samples": len(queries),
+            "k": args.k,
+            "method": args.method,
+            "candidates": args.candidates,
+            "ef_search": args.ef_search,
+            "table_bytes": await conn.fetchval("SELECT pg_table_size('blog_embedding_oai_small')"),
+            "sequential": {"p50_ms": percentile_ms(truth_latency, 50), "p95_ms": percentile_ms(truth_latency, 95)},
+            "modes": [],
+        }
+        print(f"sequential scan      p50 {results['sequential']['p50_ms']:8.2f}ms  "
+              f"p95 {results['sequential']['p95_ms']:8.2f}ms")
+
+        setting = f"SET LOCAL hnsw.ef_search = {args.ef_search}" if args.method == "hnsw" \
+            else f"SET LOCAL ivfflat.probes = {args.probes}"
+        for mode in args.modes.split(","):
+            sql, extra = _similarity_query(mode, args.k)
+            recalls, latency = [], []
+            for embedding, expected in zip(queries, truth):
+                started = time.perf_counter()
+                found = await search(conn, sql, embedding, args.k, extra, setting)
+                latency.append(time.perf_counter() - started)
+                recalls.append(len(found & expected) / max(1, len(expected)))
+            size = await index_size(conn, index_name(args.method, mode))
+            entry = {
+                "mode": mode,
+                "index_bytes": size,
+                "recall": round(float(np.mean(recalls)), 4),
+                "p50_ms": percentile_ms(latency, 50),
+                "p95_ms": percentile_ms(latency, 95),
+            }
+            results["modes"].append(entry)
+            size_mb = f"{size / 2**20:9.1f}MB" if size is not None else "  no index"
+            print(f"{mode:<10} {size_mb}  recall@{args.k} {entry['recall']:.4f}  "
+                  f"p50 {entry['p50_ms']:8.2f}ms  p95 {entry['p95_ms']:8.2f}ms")
+        return results
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url")
+    parser.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--modes", default="exact,halfvec,subvector,binary")
+    parser.add_argument("--candidates", type=int, default=40, help="SEARCH_RERANK_CANDIDATES for quantized modes")
+    parser.add_argument("--ef-search", type=int, default=40, help="hnsw.ef_search; keep it >= --candidates")
+    parser.add_argument("--probes", type=int, default=10, help="ivfflat.probes")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
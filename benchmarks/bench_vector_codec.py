@@ -0,0 +1,43 @@
+"""Encode/decode cost of the binary pgvector codec versus the old text format.
+
+Run with: python -m benchmarks.bench_vector_codec [--dim 1536] [--number 2000]
+"""
+import argparse
+import random
+import timeit
+
+from database.vector_codec import decode_vector, encode_vector
+
+
+def encode_text(value) -> str:
+    return f"[{','.join(map(str, value))}]"
+
+
+def decode_text(value: str) -> list:
+    return [float(v) for v in value.strip("[]").split(",") if v]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    embedding = [random.uniform(-1, 1) for _ in range(args.dim)]
+    text = encode_text(embedding)
+    binary = encode_vector(embedding)
+
+    cases = [
+        ("text encode", lambda: encode_text(embedding)),
+        ("binary encode", lambda: encode_vector(embedding)),
+        ("text decode", lambda: decode_text(text)),
+        ("binary decode", lambda: decode_vector(binary)),
+    ]
+    print(f"dim={args.dim} text payload={len(text)} bytes, binary payload={len(binary)} bytes")
+    for name, fn in cases:
+        best = min(timeit.repeat(fn, number=args.number, repeat=5))
+        print(f"{name:<14} {best / args.number * 1e6:9.2f} us/op")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Local stand-in for the OpenAI embeddings and chat completions APIs.
+
+Embeddings are deterministic bag-of-words hashes, so texts sharing words
+land close together and similarity search behaves plausibly. Chat
+completions return canned Markdown, optionally streamed token by token,
+with configurable latency at every step.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = (
+    "### Thought Process\n"
+    "- Looking at the blog snippets you shared 🤔\n"
+    "- Matching them against the question ✅\n\n"
+    "### Answer\n"
+    "Marine-grade plywood such as Classic Marine or Bond 710 handles moisture best, "
+    "so it is the usual pick for kitchen cabinets and bathroom vanities."
+)
+
+
+def fake_embedding(text: str, dim: int = 1536) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        seed = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+        vector += np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FakeOpenAIStats:
+    def __init__(self):
+        self.calls: Dict[str, int] = {"embeddings": 0, "embedding_inputs": 0, "chat": 0, "chat_stream": 0}
+        self.busy_seconds: Dict[str, float] = {"embeddings": 0.0, "chat": 0.0}
+
+    def as_dict(self) -> dict:
+        return {"calls": dict(self.calls), "busy_seconds": dict(self.busy_seconds)}
+
+
+def create_fake_openai_app(
+    dim: int = 1536,
+    embedding_latency: float = 0.05,
+    chat_latency: float = 0.3,
+    token_latency: float = 0.01,
+) -> FastAPI:
+    app = FastAPI()
+    stats = FakeOpenAIStats()
+    app.state.stats = stats
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        started = time.perf_counter()
+        body = await request.json()
+        inputs: List[str] = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        stats.calls["embeddings"] += 1
+        stats.calls["embedding_inputs"] += len(inputs)
+        await asyncio.sleep(embedding_latency)
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(text, body.get("dimensions") or dim)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(len(text.split()) for text in inputs)
+        stats.busy_seconds["embeddings"] += time.perf_counter() - started
+        return JSONResponse({
+            "object": "list",
+            "data": data,
+            "model": body["model"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        started = time.perf_counter()
+        body = await request.json()
+        model = body["model"]
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body["messages"])
+        if not body.get("stream"):
+            stats.calls["chat"] += 1
+            await asyncio.sleep(chat_latency + token_latency * len(ANSWER.split()))
+            stats.busy_seconds["chat"] += time.perf_counter() - started
+            return JSONResponse({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": ANSWER},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(ANSWER.split()),
+                    "total_tokens": prompt_tokens + len(ANSWER.split()),
+                },
+            })
+
+        stats.calls["chat_stream"] += 1
+
+        async def events():
+            try:
+                await asyncio.sleep(chat_latency)
+                for token in ANSWER.split(" "):
+                    chunk = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": token + " "}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(token_latency)
+                yield "data: [DONE]\n\n"
+            finally:
+                stats.busy_seconds["chat"] += time.perf_counter() - started
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
@@ -0,0 +1,280 @@
+"""Reproducible load test for every router endpoint.
+
+Runs main.app in-process under uvicorn, pointed at a local fake OpenAI
+server (benchmarks/fake_openai.py) and either an in-memory stand-in for
+blog_embedding_oai_small (default) or a real Postgres given with
+--database-url. Each endpoint is driven at the requested concurrency;
+throughput, latency percentiles, time-to-first-byte for streaming
+routes, time to the first SSE ``chunk`` event and a per-stage breakdown
+(from the Server-Timing header when the app emits one) are printed and
+written as JSON.
+
+    python -m benchmarks.load_test --requests 200 --concurrency 20 --output bench.json
+    python -m benchmarks.load_test --baseline bench-prev.json --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import uvicorn
+
+from benchmarks.fake_openai import create_fake_openai_app
+from benchmarks.memory_store import TOPICS, InMemoryVectorStore
+
+QUESTION_TEMPLATES = [
+    "Which plywood is best for {}?",
+    "How should I pick {}?",
+    "What do you recommend for {}?",
+    "Is Century Ply good for {}?",
+    "Tell me about {}",
+]
+
+
+def build_endpoints(queries: List[str], batch_size: int) -> Dict[str, dict]:
+    def batch() -> List[str]:
+        return random.sample(queries, min(batch_size, len(queries)))
+
+    return {
+        "similar": {"path": "/blog/similar", "body": lambda q: {"query": q}},
+        "similar_batch": {"path": "/blog/similar/batch", "body": lambda q: {"queries": batch()}},
+        "similar_batch_stream": {
+            "path": "/blog/similar/batch/stream", "body": lambda q: {"queries": batch()}, "stream": True,
+        },
+        "ai_response": {"path": "/blog/ai-response", "body": lambda q: {"query": q}},
+        "ai_streaming_response": {
+            "path": "/blog/ai-streaming-response", "body": lambda q: {"query": q}, "stream": True,
+        },
+        "related_question": {"path": "/blog/related-question", "body": lambda q: {"question": q}},
+        "recommend_product_blog": {
+            "path": "/blog/recommend-product-blog", "body": lambda q: {"query": q, "context": q},
+        },
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_server(app, port: int, lifespan: str = "on") -> Tuple[uvicorn.Server, asyncio.Task]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan=lifespan))
+    task = asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, task
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    if not header:
+        return timings
+    for metric in header.split(","):
+        parts = [p.strip() for p in metric.split(";")]
+        for part in parts[1:]:
+            if part.startswith("dur="):
+                timings[parts[0]] = timings.get(parts[0], 0.0) + float(part[4:])
+    return timings
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    data = np.asarray(values) * 1000
+    return {
+        "p50": round(float(np.percentile(data, 50)), 2),
+        "p95": round(float(np.percentile(data, 95)), 2),
+        "p99": round(float(np.percentile(data, 99)), 2),
+        "mean": round(float(data.mean()), 2),
+        "max": round(float(data.max()), 2),
+    }
+
+
+async def run_endpoint(http: httpx.AsyncClient, endpoint: dict, queries: List[str],
+                       requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    ttfbs: List[float] = []
+    ttfts: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+
+    async def one(i: int) -> None:
+        body = endpoint["body"](queries[i % len(queries)])
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with http.stream("POST", endpoint["path"], json=body) as response:
+                    first = first_chunk = None
+                    async for data in response.aiter_raw():
+                        if first is None:
+                            first = time.perf_counter()
+                        if first_chunk is None and b"event: chunk" in data:
+                            first_chunk = time.perf_counter()
+                    elapsed = time.perf_counter() - started
+                    if response.status_code >= 400:
+                        errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                        return
+                    latencies.append(elapsed)
+                    if endpoint.get("stream") and first is not None:
+                        ttfbs.append(first - started)
+                    if first_chunk is not None:
+                        ttfts.append(first_chunk - started)
+                    for name, duration in parse_server_timing(response.headers.get("server-timing")).items():
+                        stages.setdefault(name, []).append(duration / 1000)
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    duration = time.perf_counter() - started
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2) if duration else 0.0,
+        "latency_ms": summarize(latencies),
+    }
+    if ttfbs:
+        result["ttfb_ms"] = summarize(ttfbs)
+    if ttfts:
+        result["ttft_ms"] = summarize(ttfts)
+    if stages:
+        result["stages_ms"] = {name: summarize(values) for name, values in sorted(stages.items())}
+    return result
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results: dict, baseline: dict) -> None:
+    print("\nchange vs baseline (p50 / p95 latency, throughput):")
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous or not current["latency_ms"] or not previous["latency_ms"]:
+            continue
+        deltas = [
+            (current["latency_ms"][k] - previous["latency_ms"][k]) / previous["latency_ms"][k] * 100
+            for k in ("p50", "p95")
+        ]
+        throughput = (
+            (current["throughput_rps"] - previous["throughput_rps"]) / previous["throughput_rps"] * 100
+            if previous["throughput_rps"] else 0.0
+        )
+        print(f"  {name:<24} p50 {deltas[0]:+6.1f}%  p95 {deltas[1]:+6.1f}%  rps {throughput:+6.1f}%")
+
+
+async def main(args: argparse.Namespace) -> dict:
+    random.seed(args.seed)
+    fake_app = create_fake_openai_app(
+        dim=args.dim,
+        embedding_latency=args.embedding_latency,
+        chat_latency=args.chat_latency,
+        token_latency=args.token_latency,
+    )
+    fake_port = free_port()
+    fake_server, fake_task = await start_server(fake_app, fake_port)
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{fake_port}/v1"
+
+    from main import app
+    from services.openai_client import create_openai_client
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+        lifespan = "on"
+    else:
+        # Stand in for the lifespan hook: in-memory store plus the real tuned client
+        app.state.db_pool = InMemoryVectorStore(args.corpus_size, args.dim, args.db_latency)
+        app.state.openai_client = create_openai_client()
+        lifespan = "off"
+    app_port = free_port()
+    app_server, app_task = await start_server(app, app_port, lifespan=lifespan)
+
+    queries = [
+        template.format(topic)
+        for topic in TOPICS
+        for template in QUESTION_TEMPLATES
+    ][:args.unique_queries]
+    random.shuffle(queries)
+    endpoints = build_endpoints(queries, args.batch_size)
+    selected = args.endpoints.split(",") if args.endpoints else list(endpoints)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": git_revision(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "endpoints": {},
+    }
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=timeout) as http:
+        for name in selected:
+            result = await run_endpoint(http, endpoints[name], queries, args.requests, args.concurrency)
+            results["endpoints"][name] = result
+            latency = result["latency_ms"]
+            line = (
+                f"{name:<24} {result['throughput_rps']:8.1f} rps  "
+                f"p50 {latency.get('p50', 0):8.1f}ms  p95 {latency.get('p95', 0):8.1f}ms  "
+                f"p99 {latency.get('p99', 0):8.1f}ms"
+            )
+            if "ttfb_ms" in result:
+                line += f"  ttfb p50 {result['ttfb_ms']['p50']:7.1f}ms"
+            if "ttft_ms" in result:
+                line += f"  ttft p50 {result['ttft_ms']['p50']:7.1f}ms"
+            if result["errors"]:
+                line += f"  errors {result['errors']}"
+            print(line)
+    results["upstream"] = fake_app.state.stats.as_dict()
+
+    app_server.should_exit = True
+    await app_task
+    fake_server.should_exit = True
+    await fake_task
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--endpoints", help="comma-separated subset of endpoints to run")
+    parser.add_argument("--unique-queries", type=int, default=50, help="distinct questions to cycle through")
+    parser.add_argument("--batch-size", type=int, default=8, help="queries per batch-endpoint request")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--corpus-size", type=int, default=5000, help="chunks in the in-memory store")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="seconds per in-memory query")
+    parser.add_argument("--database-url", help="use a real Postgres instead of the in-memory store")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="seconds per streamed token")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(results, json.load(f))
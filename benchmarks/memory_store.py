@@ -0,0 +1,139 @@
+"""In-memory stand-in for an asyncpg pool over blog_embedding_oai_small.
+
+Implements just the connection surface used by database.queries and the
+routes: fetch/fetchval/execute, cursors and transactions. Distances are
+exact cosine distances computed with NumPy, with an optional per-query
+delay to model the database round trip.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from benchmarks.fake_openai import fake_embedding
+
+TOPICS = [
+    "waterproof plywood for kitchen cabinets",
+    "marine plywood for bathroom vanities",
+    "moisture resistant plywood for bedroom wardrobes",
+    "film face plywood for concrete formwork",
+    "engineered wooden doors for apartments",
+    "laminated doors versus veneered doors",
+    "decorative laminates for modular kitchens",
+    "neutral laminate colours for modern interiors",
+    "termite protection in plywood furniture",
+    "choosing the right thickness of plywood",
+]
+
+
+def generate_corpus(size: int, dim: int = 1536):
+    documentids, contents = [], []
+    for i in range(size):
+        topic = TOPICS[i % len(TOPICS)]
+        documentids.append(f"blog-{i // 4}")
+        contents.append(f"Chunk {i} about {topic}. Century Ply guide part {i % 4}.")
+    embeddings = np.stack([fake_embedding(text, dim) for text in contents])
+    return documentids, contents, embeddings
+
+
+class InMemoryConnection:
+    def __init__(self, store: "InMemoryVectorStore"):
+        self.store = store
+
+    def _search(self, query_embedding: Sequence[float], limit: int) -> List[dict]:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        distances = 1.0 - self.store.embeddings @ query
+        k = min(limit, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [
+            {
+                "documentid": self.store.documentids[i],
+                "content": self.store.contents[i],
+                "similarity": float(distances[i]),
+            }
+            for i in top
+        ]
+
+    async def fetch(self, sql: str, *args) -> List[dict]:
+        await asyncio.sleep(self.store.latency)
+        if "blog_related_questions" in sql:
+            return []  # nothing precomputed, so every request exercises the LLM fallback
+        if "unnest" in sql:
+            query_embeddings, limit = args[0], args[1]
+            rows = []
+            for ord_, query_embedding in enumerate(query_embeddings, start=1):
+                rows.extend(dict(row, ord=ord_) for row in self._search(query_embedding, limit))
+            return rows
+        return self._search(args[0], args[1])
+
+    def cursor(self, sql: str, *args, prefetch: Optional[int] = None):
+        async def rows():
+            for row in await self.fetch(sql, *args):
+                yield row
+        return rows()
+
+    def transaction(self):
+        @asynccontextmanager
+        async def noop():
+            yield
+        return noop()
+
+    async def fetchval(self, sql: str, *args):
+        return 1
+
+    async def execute(self, sql: str, *args) -> str:
+        return ""
+
+
+class _Acquire:
+    def __init__(self, pool: "InMemoryVectorStore"):
+        self.pool = pool
+        self.conn: Optional[InMemoryConnection] = None
+
+    def __await__(self):
+        return self.pool._acquire().__await__()
+
+    async def __aenter__(self) -> InMemoryConnection:
+        self.conn = await self.pool._acquire()
+        return self.conn
+
+    async def __aexit__(self, *exc) -> None:
+        await self.pool.release(self.conn)
+
+
+class InMemoryVectorStore:
+    """Looks enough like asyncpg.Pool for app.state.db_pool."""
+
+    def __init__(self, corpus_size: int = 5000, dim: int = 1536, latency: float = 0.002, max_size: int = 10):
+        self.documentids, self.contents, self.embeddings = generate_corpus(corpus_size, dim)
+        self.latency = latency
+        self._max_size = max_size
+        self._semaphore = asyncio.Semaphore(max_size)
+
+    def acquire(self, timeout: Optional[float] = None) -> _Acquire:
+        return _Acquire(self)
+
+    async def _acquire(self) -> InMemoryConnection:
+        await self._semaphore.acquire()
+        return InMemoryConnection(self)
+
+    async def release(self, conn) -> None:
+        self._semaphore.release()
+
+    def get_size(self) -> int:
+        return self._max_size
+
+    def get_idle_size(self) -> int:
+        return self._semaphore._value
+
+    def get_min_size(self) -> int:
+        return self._max_size
+
+    def get_max_size(self) -> int:
+        return self._max_size
+
+    async def close(self) -> None:
+        pass
@@ -1,11 +1,26 @@
 
-from database.queries import perform_similarity_search
-from models.search import Context, ResponseData, BlogContent
-from typing import List, cast, Optional
+from database.connection import pool_acquire_timeout
+from database.queries import perform_similarity_search, perform_batch_similarity_search, iter_batch_similarity_search, fetch_related_questions
+from services.embeddings import embed_query, embed_queries
+from services.embedding_cache import normalize_query
+from services.singleflight import SingleFlight
+from services.answer_cache import get_answer_cache
+from services.pipeline import Stage, StageError, run_stage, run_concurrently, stage_timeout
+from services.metrics import timed
+from services.context_packer import build_user_message
+from services.product_catalogue import get_product_catalogue
+from services.related_questions import get_related_question_cache, question_messages, parse_questions
+from services.admission import Overloaded, admitted, chat_tokens, overloaded_cause, raise_if_overloaded
+from models.search import Context, ResponseData, BlogContent, QuerySearchResponse
+from typing import List, Tuple, cast, Optional
 import os
+import asyncio
+import json
+import logging
 
+import asyncpg
 from fastapi import HTTPException
-from openai import OpenAI
+from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam, ChatCompletionUserMessageParam, ChatCompletionSystemMessageParam
 
 
@@ -18,27 +33,81 @@ INSUFFICIENT_CONTEXT_RESPONSE = ResponseData(
     answer="I apologize, but I couldn't find enough relevant information in our blog database to provide a complete and accurate answer to your question. Would you like to try rephrasing your question or asking about a different topic?",
 )
 
+OVERLOADED_RESPONSE = ResponseData(
+    thought_process=[
+        "Found blog content related to your question",
+        "Answer generation is at capacity right now"
+    ],
+    answer="We're handling a lot of questions at the moment, so here are the most relevant articles from our blog instead. Please try again in a little while for a full answer.",
+)
+
+logger = logging.getLogger(__name__)
+
+ai_response_flight = SingleFlight()
+
 
 class SearchController:
     @staticmethod
-    async def generate_embedding(query: str) -> List[float]:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        response = client.embeddings.create(
-            input=query,
-            model=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-        )
-        return response.data[0].embedding
+    async def generate_embedding(query: str, client: AsyncOpenAI) -> List[float]:
+        return await embed_query(query, client)
+
+    @staticmethod
+    async def retrieve(query: str, db, client: AsyncOpenAI, limit: int) -> Tuple[List[float], List[Context]]:
+        """Embedding then similarity search, each bounded by its own stage timeout."""
+        query_embedding = await run_stage(Stage(
+            "embedding",
+            lambda: SearchController.generate_embedding(query, client),
+            stage_timeout("embedding", 10)
+        ))
+        context = await run_stage(Stage(
+            "search",
+            lambda: perform_similarity_search(db, query_embedding, limit),
+            stage_timeout("search", 5)
+        ))
+        return query_embedding, context
+
+    @staticmethod
+    async def find_similar(query: str, db, client: AsyncOpenAI) -> dict:
+        try:
+            _, context = await SearchController.retrieve(query, db, client, 5)
+            return context
+        except Exception as e:
+            raise_if_overloaded(e)
+            raise HTTPException(status_code=500, detail=str(e))
 
     @staticmethod
-    async def find_similar(query: str, db) -> dict:
+    async def find_similar_batch(queries: List[str], limit: int, db, client: AsyncOpenAI) -> List[QuerySearchResponse]:
         try:
-            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            query_embedding = await SearchController.generate_embedding(query)
-            vector_string = f"[{','.join(map(str, query_embedding))}]"
-            return await perform_similarity_search(db, vector_string, limit=5)
+            with timed("embedding"):
+                query_embeddings = await embed_queries(queries, client)
+            with timed("batch_search"):
+                results = await perform_batch_similarity_search(db, query_embeddings, limit)
+            return [
+                QuerySearchResponse(query=query, message="Similar blogs found", results=hits)
+                for query, hits in zip(queries, results)
+            ]
         except Exception as e:
+            raise_if_overloaded(e)
             raise HTTPException(status_code=500, detail=str(e))
 
+    @staticmethod
+    async def stream_similar_batch(queries: List[str], limit: int, pool, client: AsyncOpenAI):
+        """Yield one NDJSON line per query as soon as its hits come off the cursor."""
+        try:
+            with timed("embedding"):
+                query_embeddings = await embed_queries(queries, client)
+            async with pool.acquire(timeout=pool_acquire_timeout()) as conn:
+                async for index, hits in iter_batch_similarity_search(conn, query_embeddings, limit):
+                    result = QuerySearchResponse(query=queries[index], message="Similar blogs found", results=hits)
+                    yield result.model_dump_json() + "\n"
+        except Exception as e:
+            logger.error(f"Error in stream_similar_batch: {e}")
+            overloaded = overloaded_cause(e)
+            error = {"error": str(e)}
+            if overloaded is not None:
+                error["retry_after"] = overloaded.retry_after
+            yield json.dumps(error) + "\n"
+
     @staticmethod
     def format_insufficient_context_markdown() -> str:
         """Format insufficient context response as Markdown"""
@@ -54,18 +123,54 @@ class SearchController:
         )
 
     @staticmethod
-    async def generate_ai_response(query: str, db) -> str:  # Returns Markdown string
-        try:
-            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def format_overloaded_markdown(context: List[Context]) -> str:
+        """Retrieval-only answer for when no completion capacity is available."""
+        thought_process_md = ""
+        for thought in OVERLOADED_RESPONSE.thought_process:
+            thought_process_md += f"- {thought}\n"
+        articles_md = ""
+        for documentid in dict.fromkeys(c.documentid for c in context):
+            articles_md += f"- {documentid}\n"
+        return (
+            "### Thought Process\n"
+            f"{thought_process_md}\n"
+            "### Answer\n"
+            f"{OVERLOADED_RESPONSE.answer}\n\n"
+            f"{articles_md}"
+        )
+
+    @staticmethod
+    async def generate_ai_response(query: str, pool, client: AsyncOpenAI) -> str:  # Returns Markdown string
+        # Identical questions arriving together share one embedding/search/completion run,
+        # which leases its own connection so joiners hold none
+        return await ai_response_flight.do(
+            normalize_query(query),
+            lambda: SearchController._generate_ai_response(query, pool, client)
+        )
 
-            # Generate embedding and get context
-            query_embedding = await SearchController.generate_embedding(query)
-            vector_string = f"[{','.join(map(str, query_embedding))}]"
-            context = await perform_similarity_search(db, vector_string, 5)
+    @staticmethod
+    async def _generate_ai_response(query: str, pool, client: AsyncOpenAI) -> str:
+        try:
+            # Generate embedding and get context; the connection is released before the completion
+            try:
+                with timed("db_acquire"):
+                    conn = await pool.acquire(timeout=pool_acquire_timeout())
+            except asyncio.TimeoutError:
+                logger.error("Timed out waiting for a database connection")
+                raise HTTPException(status_code=503, detail="Database busy, please retry")
+            try:
+                query_embedding, context = await SearchController.retrieve(query, conn, client, 5)
+            finally:
+                await pool.release(conn)
 
             if not context or all(c.similarity > 0.8 for c in context[0:2]):
                 return SearchController.format_insufficient_context_markdown()
 
+            documentids = [c.documentid for c in context]
+            cached_answer = get_answer_cache().get(query_embedding, documentids)
+            if cached_answer is not None:
+                return cached_answer
+
             system_prompt = """
 You are an AI assistant for a blog-based product recommendation system. Your task is to synthesize a coherent and helpful answer
 based on the given question and relevant blog content.
@@ -92,115 +197,153 @@ Your complete answer here
 
             messages = [
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Question: {query}\n\nContext: {context}"}
+                {"role": "user", "content": build_user_message(query, context)}
             ]
 
-            # Use gpt-3.5-turbo for markdown response
-            completion = client.chat.completions.create(
-                model=os.getenv("CHAT_COMPLETION_MODEL", "gpt-4.1-nano-2025-04-14"),
-                messages=messages,  # type: ignore
-                temperature=0.7,
-                max_tokens=1000
-            )
+            model = os.getenv("CHAT_COMPLETION_MODEL", "gpt-4.1-nano-2025-04-14")
+            try:
+                completion = await run_stage(Stage(
+                    "completion",
+                    lambda: admitted(model, lambda: client.chat.completions.create(
+                        model=model,
+                        messages=messages,  # type: ignore
+                        temperature=0.7,
+                        max_tokens=1000
+                    ), chat_tokens(messages, 1000)),
+                    stage_timeout("completion", 60)
+                ))
+            except StageError as e:
+                if overloaded_cause(e) is None:
+                    raise
+                # Retrieval already succeeded, so degrade to the matching articles
+                return SearchController.format_overloaded_markdown(context)
 
             response_content = completion.choices[0].message.content or ""
-            print("AI Response:", response_content)
-            
+            logger.debug("AI Response: %s", response_content)
+            if response_content:
+                get_answer_cache().put(query_embedding, documentids, response_content)
+
             return response_content
 
+        except HTTPException:
+            raise
         except Exception as e:
+            raise_if_overloaded(e)
             print(f"Error in generate_ai_response: {e}")
             raise HTTPException(status_code=500, detail=str(e))
 
     @staticmethod
-    async def generate_related_question(question: str, context: Optional[str] = None) -> list[str]:
+    async def generate_related_question(question: str, db, client: AsyncOpenAI, context: Optional[str] = None) -> list[str]:
+        cache = get_related_question_cache()
         try:
-            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            system_prompt = (
-                "You are an AI assistant. Given a user's question, generate a list of 5 highly relevant, natural-sounding follow-up or related questions that would help deepen the conversation or clarify the topic. "
-                "Do not answer the original question, just return a numbered or bulleted list of 5 related questions."
-            )
-            user_content = f"Original question: {question}"
-            if context:
-                user_content += f"\n\nContext: {context}"
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ]
-            completion = client.chat.completions.create(
-                model=os.getenv("CHAT_COMPLETION_MODEL", "gpt-4.1-nano-2025-04-14"),
-                messages=messages,  # type: ignore
-                temperature=0.7,
-                max_tokens=256
-            )
-            content = completion.choices[0].message.content or ""
-            lines = [line.strip("- ").strip() for line in content.splitlines() if line.strip() and (line.strip()[0].isdigit() or line.strip().startswith("-"))]
-            if not lines:
-                lines = [l.strip() for l in content.split("\n") if l.strip()]
+            # Nearest document with precomputed questions answers without an LLM call
+            embedding = await SearchController.generate_embedding(question, client)
+            with timed("search"):
+                nearest = await perform_similarity_search(
+                    db, embedding, int(os.getenv("RELATED_QUESTIONS_CANDIDATES", "3"))
+                )
+            max_distance = float(os.getenv("RELATED_QUESTIONS_MAX_DISTANCE", "0.6"))
+            candidates = [c.documentid for c in nearest if c.similarity <= max_distance]
+            if candidates:
+                try:
+                    stored = await fetch_related_questions(db, candidates)
+                except asyncpg.UndefinedTableError:
+                    logger.warning("blog_related_questions is missing; apply database/migrations/blog_related_questions.sql")
+                    stored = {}
+                for documentid in candidates:
+                    if stored.get(documentid):
+                        cache.precomputed += 1
+                        return stored[documentid]
+
+            cached = cache.get(question, context)
+            if cached is not None:
+                return cached
+            messages = question_messages(question, context)
+            model = os.getenv("CHAT_COMPLETION_MODEL", "gpt-4.1-nano-2025-04-14")
+            completion = await run_stage(Stage(
+                "completion",
+                lambda: admitted(model, lambda: client.chat.completions.create(
+                    model=model,
+                    messages=messages,  # type: ignore
+                    temperature=0.7,
+                    max_tokens=256
+                ), chat_tokens(messages, 256)),
+                stage_timeout("completion", 60)
+            ))
+            lines = parse_questions(completion.choices[0].message.content or "")
+            if lines:
+                cache.put(question, context, lines)
             return lines
         except Exception as e:
+            raise_if_overloaded(e)
             print(f"Error in generate_related_question: {e}")
             raise HTTPException(status_code=500, detail=str(e))
 
     @staticmethod
-    async def recommend_product_blog(query: str, context: str, db) -> dict:
+    async def recommend_product_blog(query: str, context: str, db, client: AsyncOpenAI) -> dict:
         try:
-            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            # Static product listing
-            static_product_list = (
-            "Here are the available product categories and their typical applications:\n\n"
-            "**Plywood** (used for structural strength, waterproofing, and furniture):\n"
-            "- Architect Ply: premium strength, ideal for interiors.\n"
-            "- Bond 710 / Sainik 710: waterproof, suitable for kitchen, bathroom.\n"
-            "- Win MR / Sainik MR: moisture-resistant, ideal for indoor furniture.\n"
-            "- Century Film Face: construction formwork.\n"
-            "- Classic Marine: strong marine-grade, moisture heavy areas.\n"
-            "\n"
-            "**Doors** (used for entryways and room partitions):\n"
-            "- Club Prime Doors, Bond Doors, Sainik Doors: engineered wooden doors.\n"
-            "- Melamine Door Skin, White Primered Door: pre-finished or paint-ready.\n"
-            "- Laminated / Veneered Doors: decorative surface finishes.\n"
-            "\n"
-            "**Laminates** (used for surface finishes on furniture, wardrobes, etc.):\n"
-            "- Classy Wine, Smoke Green, Emerald Green: decorative color laminates.\n"
-            "- Frosty White, Silica Grey: neutral tones for modern interior.\n"
-            "- Black, Mudpie: bold and earthy shades.\n"
-            "- Brazilian Sand, Pebble Ivory: natural stone and wood patterns.\n"
+            # Product selection and blog retrieval are independent, so run them together
+            results = await run_concurrently(
+                Stage(
+                    "recommendation",
+                    lambda: SearchController.recommend_products(context, client),
+                    stage_timeout("recommendation", 30)
+                ),
+                Stage(
+                    "retrieval",
+                    lambda: SearchController.retrieve(query, db, client, 3),
+                    stage_timeout("retrieval", 15)
+                ),
             )
-            system_prompt = (
-            "You are a professional product recommender.\n"
-            "Given the user's context, you must first determine whether they are referring to **plywood, doors, or laminates**, "
-            "and then recommend **at least 2 relevant products** from the appropriate category.\n"
-            "If the user's use-case is unclear, infer from common construction/interior use cases.\n"
-            "Output only a comma-separated list of product names (no explanation).\n\n"
-            f"{static_product_list}"
-            )
-            user_prompt = f"Context: {context}"
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-            completion = client.chat.completions.create(
-                model=os.getenv("CHAT_COMPLETION_MODEL", "gpt-4.1-nano-2025-04-14"),
-                messages=messages,  # type: ignore
-                temperature=0.7,
-                max_tokens=256
-            )
-            response_content = completion.choices[0].message.content or ""
-            recommended_products = [p.strip() for p in response_content.split(",") if p.strip()]
-
-            query_embedding = await SearchController.generate_embedding(query)
-            vector_string = f"[{','.join(map(str, query_embedding))}]"
-            blog_content = await perform_similarity_search(db, vector_string, 3)
+            _, blog_content = results["retrieval"]
             blog_content = [
                 BlogContent(documentid=c.documentid, similarity=c.similarity)
                 for c in blog_content
             ]
             response_data = {
-                    "recommended_products": recommended_products,
+                    "recommended_products": results["recommendation"],
                     "blog_content": blog_content
             }
             return response_data
         except Exception as e:
+            raise_if_overloaded(e)
             print(f"Error in recommend_product: {e}")
             raise HTTPException(status_code=500, detail=str(e))
+
+    @staticmethod
+    async def recommend_products(context: str, client: AsyncOpenAI) -> List[str]:
+        catalogue = get_product_catalogue()
+        await catalogue.load(client)
+        embedding = await embed_query(context, client)
+        matched = catalogue.match(embedding)
+        if matched is not None:
+            return matched
+        # Ambiguous match: let the LLM pick from the same catalogue
+        static_product_list = catalogue.render()
+        categories = ", ".join(c["name"].lower() for c in catalogue.categories)
+        system_prompt = (
+        "You are a professional product recommender.\n"
+        f"Given the user's context, you must first determine which of these they are referring to: **{categories}**, "
+        "and then recommend **at least 2 relevant products** from the appropriate category.\n"
+        "If the user's use-case is unclear, infer from common construction/interior use cases.\n"
+        "Output only a comma-separated list of product names (no explanation).\n\n"
+        f"{static_product_list}"
+        )
+        user_prompt = f"Context: {context}"
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        model = os.getenv("CHAT_COMPLETION_MODEL", "gpt-4.1-nano-2025-04-14")
+        try:
+            completion = await admitted(model, lambda: client.chat.completions.create(
+                model=model,
+                messages=messages,  # type: ignore
+                temperature=0.7,
+                max_tokens=256
+            ), chat_tokens(messages, 256))
+        except Overloaded:
+            # No LLM capacity: the closest catalogue match beats failing the request
+            return catalogue.best_guess(embedding)
+        response_content = completion.choices[0].message.content or ""
+        return [p.strip() for p in response_content.split(",") if p.strip()]
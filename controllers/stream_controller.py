@@ -1,27 +1,118 @@
-from database.queries import perform_similarity_search
+from database.connection import pool_acquire_timeout
+from controllers.search_controller import SearchController
 from models.search import Context
+from services.embeddings import embed_query
+from services.embedding_cache import normalize_query
+from services.singleflight import StreamSingleFlight
+from services.answer_cache import get_stream_answer_cache
+from services.context_packer import build_user_message
+from services.metrics import LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS_PER_SECOND, record_stage
+from services.admission import Overloaded, admit, chat_tokens, overloaded_cause
 import os
 from fastapi import HTTPException
 from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam
+import asyncio
 import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+stream_flight = StreamSingleFlight()
+
+_DONE = object()
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _wait_for_disconnect(request) -> None:
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
 
 class StreamController:
     @staticmethod
-    async def generate_embedding(query: str) -> list[float]:
-        client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        response = await client.embeddings.create(
-            input=query,
-            model="text-embedding-3-small"
+    async def generate_embedding(query: str, client: AsyncOpenAI) -> list[float]:
+        return await embed_query(query, client)
+
+    @staticmethod
+    async def sse_stream(query: str, request, pool, client: AsyncOpenAI):
+        """Server-sent events for /blog/ai-streaming-response.
+
+        A progress event is flushed before any retrieval work so clients see
+        bytes immediately; the DB connection is held only for retrieval.
+        Heartbeat comments keep idle proxies from closing the stream, and a
+        client disconnect cancels the pipeline, which aborts the upstream
+        OpenAI stream.
+        """
+        heartbeat = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            try:
+                await queue.put(sse_event("progress", {"stage": "retrieving"}))
+                async with pool.acquire(timeout=pool_acquire_timeout()) as conn:
+                    query_embedding, context = await SearchController.retrieve(query, conn, client, 5)
+                await queue.put(sse_event("progress", {"stage": "generating"}))
+                async for chunk in StreamController.shared_openai_stream(query, query_embedding, context, client):
+                    await queue.put(sse_event("chunk", {"content": chunk}))
+                await queue.put(sse_event("done", {}))
+            except Exception as e:
+                logger.error(f"StreamController error: {e}")
+                error = {"detail": str(e)}
+                overloaded = overloaded_cause(e)
+                if overloaded is not None:
+                    error["retry_after"] = overloaded.retry_after
+                await queue.put(sse_event("error", error))
+            finally:
+                await queue.put(_DONE)
+
+        producer = asyncio.ensure_future(produce())
+        watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+        watcher.add_done_callback(lambda _: producer.cancel())
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is _DONE:
+                    break
+                yield event
+        finally:
+            watcher.cancel()
+            producer.cancel()
+            await asyncio.gather(producer, watcher, return_exceptions=True)
+
+    @staticmethod
+    def shared_openai_stream(query: str, query_embedding, context, client: AsyncOpenAI):
+        """Replay a cached answer, join an identical in-flight stream, or start one."""
+        documentids = [c.documentid for c in context]
+        cached_answer = get_stream_answer_cache().get(query_embedding, documentids)
+        if cached_answer is not None:
+            return StreamController.replay_stream(cached_answer)
+        return stream_flight.subscribe(
+            normalize_query(query),
+            lambda: StreamController.openai_stream(query, context, client, query_embedding)
         )
-        return response.data[0].embedding
 
     @staticmethod
-    async def openai_stream(query: str, context):
+    async def replay_stream(answer: str, chunk_size: int = 256):
+        for start in range(0, len(answer), chunk_size):
+            yield answer[start:start + chunk_size]
+
+    @staticmethod
+    async def openai_stream(query: str, context, client: AsyncOpenAI, query_embedding=None):
         try:
-            client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
             model_name = os.getenv("OPENAI_MODEL_NAME", "gpt-4.1-nano-2025-04-14")
-            print("similarity",context[0].similarity)
+            if context:
+                logger.debug("similarity %s", context[0].similarity)
             # Removed low-similarity fallback block; now handled in prompt
 
             system_prompt = """
@@ -57,18 +148,40 @@ class StreamController:
 
             messages: list[ChatCompletionMessageParam] = [
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Question: {query}\n\nContext: {context}"}
+                {"role": "user", "content": build_user_message(query, context)}
             ]
-            stream = await client.chat.completions.create(
-                model=model_name,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=1000,
-                stream=True
-            )
-            async for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            started = time.perf_counter()
+            first_token_at = None
+            parts = []
+            async with admit(model_name, chat_tokens(messages, 1000)):
+                stream = await client.chat.completions.create(
+                    model=model_name,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=1000,
+                    stream=True
+                )
+                try:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                                LLM_TIME_TO_FIRST_TOKEN.observe(first_token_at - started)
+                            parts.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                finally:
+                    # Closes the upstream HTTP response, so a cancelled stream stops billing tokens
+                    await stream.close()
+            finished = time.perf_counter()
+            record_stage("completion_stream", finished - started)
+            if first_token_at is not None and finished > first_token_at:
+                LLM_TOKENS_PER_SECOND.observe(len(parts) / (finished - first_token_at))
+            if query_embedding is not None and parts:
+                get_stream_answer_cache().put(query_embedding, [c.documentid for c in context], "".join(parts))
+        except Overloaded:
+            # No completion capacity: stream the retrieved articles instead
+            yield SearchController.format_overloaded_markdown(context)
         except Exception as e:
-            print(f"StreamController error: {e}")
-            yield f"Error: {str(e)}"
\ No newline at end of file
+            # Propagate so sse_stream sends an error event to every subscriber
+            logger.error(f"StreamController error: {e}")
+            raise
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""Create, rebuild and inspect ANN indexes on blog_embedding_oai_small.
+
+    python -m database.ann_index status
+    python -m database.ann_index create --method hnsw --m 16 --ef-construction 64
+    python -m database.ann_index create --method hnsw --m 32 --replace
+    python -m database.ann_index create --method ivfflat --lists 1000
+    python -m database.ann_index rebuild --method hnsw
+    python -m database.ann_index drop --method ivfflat
+    python -m database.ann_index create --method hnsw --quantization binary
+
+Indexes use vector_cosine_ops to match the ``<=>`` operator used by
+database.queries. With --quantization the index is built over a compact
+expression from database.quantization instead, which SEARCH_MODE search
+uses for candidates before re-ranking on the full vectors. Builds run
+CONCURRENTLY unless --blocking is given, so the API keeps serving while
+they run. create builds next to an existing index (with --replace) and
+swaps it in at the end, so searches never run without one.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+from typing import Optional
+
+import asyncpg
+from dotenv import load_dotenv
+
+from database.quantization import quantization
+
+logger = logging.getLogger(__name__)
+
+TABLE = "blog_embedding_oai_small"
+
+
+def index_name(method: str, mode: Optional[str] = None) -> str:
+    if mode and mode != "exact":
+        return f"{TABLE}_embedding_{mode}_{method}_idx"
+    return f"{TABLE}_embedding_{method}_idx"
+
+
+def index_target(mode: Optional[str] = None) -> str:
+    """Indexed column or expression with its operator class."""
+    if not mode or mode == "exact":
+        return "embedding vector_cosine_ops"
+    compact = quantization(mode)
+    return f"{compact.expression} {compact.opclass}"
+
+
+async def row_count(conn: asyncpg.Connection) -> int:
+    # reltuples is an estimate but avoids a full scan on large tables
+    estimate = await conn.fetchval("SELECT reltuples::bigint FROM pg_class WHERE oid = $1::regclass", TABLE)
+    if estimate is None or estimate < 0:
+        return await conn.fetchval(f"SELECT count(*) FROM {TABLE}")
+    return estimate
+
+
+def default_lists(rows: int) -> int:
+    """pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond."""
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+async def index_valid(conn: asyncpg.Connection, name: str) -> Optional[bool]:
+    """Whether index ``name`` is valid, or None if it does not exist."""
+    return await conn.fetchval(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", name
+    )
+
+
+async def create_index(conn: asyncpg.Connection, method: str, m: int = 16, ef_construction: int = 64,
+                       lists: Optional[int] = None, concurrently: bool = True,
+                       maintenance_work_mem: Optional[str] = None, parallel_workers: Optional[int] = None,
+                       mode: Optional[str] = None, replace: bool = False) -> str:
+    """Build the index under a temporary name, then swap it in.
+
+    An existing index keeps serving queries for the whole build and is
+    only dropped in the short transaction that renames the new one.
+    """
+    name = index_name(method, mode)
+    building = f"{name}_new"
+    if await index_valid(conn, name) and not replace:
+        raise ValueError(f"{name} already exists; pass --replace to rebuild it with new options")
+    if method == "hnsw":
+        options = f"(m = {int(m)}, ef_construction = {int(ef_construction)})"
+    elif method == "ivfflat":
+        if lists is None:
+            lists = default_lists(await row_count(conn))
+        options = f"(lists = {int(lists)})"
+    else:
+        raise ValueError(f"Unknown index method: {method}")
+    if maintenance_work_mem:
+        await conn.execute(f"SET maintenance_work_mem = '{maintenance_work_mem}'")
+    if parallel_workers is not None:
+        await conn.execute(f"SET max_parallel_maintenance_workers = {int(parallel_workers)}")
+    # Leftover from an interrupted build
+    await conn.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {building}")
+    await conn.execute(
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}{building} "
+        f"ON {TABLE} USING {method} ({index_target(mode)}) WITH {options}"
+    )
+    async with conn.transaction():
+        await conn.execute(f"DROP INDEX IF EXISTS {name}")
+        await conn.execute(f"ALTER INDEX {building} RENAME TO {name}")
+    await conn.execute(f"ANALYZE {TABLE}")
+    logger.info(f"Created {name} {options}")
+    return name
+
+
+async def rebuild_index(conn: asyncpg.Connection, method: str, concurrently: bool = True,
+                        mode: Optional[str] = None) -> None:
+    await conn.execute(f"REINDEX INDEX {'CONCURRENTLY ' if concurrently else ''}{index_name(method, mode)}")
+
+
+async def drop_index(conn: asyncpg.Connection, method: str, concurrently: bool = True,
+                     mode: Optional[str] = None) -> None:
+    await conn.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {index_name(method, mode)}")
+
+
+async def index_status(conn: asyncpg.Connection) -> list:
+    return await conn.fetch("""
+        SELECT i.indexrelid::regclass::text AS name,
+               am.amname AS method,
+               pg_size_pretty(pg_relation_size(i.indexrelid)) AS size,
+               i.indisvalid AS valid,
+               pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE i.indrelid = $1::regclass
+        ORDER BY name
+    """, TABLE)
+
+
+async def main(args: argparse.Namespace) -> None:
+    conn = await asyncpg.connect(args.database_url or os.getenv("DATABASE_URL"))
+    try:
+        concurrently = not args.blocking
+        if args.command == "create":
+            await create_index(conn, args.method, args.m, args.ef_construction, args.lists, concurrently,
+                               args.maintenance_work_mem, args.parallel_workers, args.quantization, args.replace)
+        elif args.command == "rebuild":
+            await rebuild_index(conn, args.method, concurrently, args.quantization)
+        elif args.command == "drop":
+            await drop_index(conn, args.method, concurrently, args.quantization)
+        print(f"{TABLE}: ~{await row_count(conn)} rows")
+        for row in await index_status(conn):
+            print(f"  {row['name']:<50} {row['method']:<8} {row['size']:>10} valid={row['valid']}")
+            print(f"    {row['definition']}")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["status", "create", "rebuild", "drop"])
+    parser.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--m", type=int, default=16, help="HNSW graph degree")
+    parser.add_argument("--ef-construction", type=int, default=64, help="HNSW build candidate list size")
+    parser.add_argument("--lists", type=int, help="IVFFlat list count (default from row count)")
+    parser.add_argument("--maintenance-work-mem", help="e.g. 2GB; keep the HNSW graph in memory while building")
+    parser.add_argument("--parallel-workers", type=int, help="max_parallel_maintenance_workers for the build")
+    parser.add_argument("--quantization", choices=["halfvec", "subvector", "binary"],
+                        help="index a compact expression instead of the full vector (see database.quantization)")
+    parser.add_argument("--replace", action="store_true",
+                        help="create over an existing valid index (built alongside it, then swapped in)")
+    parser.add_argument("--blocking", action="store_true", help="build without CONCURRENTLY (faster, locks writes)")
+    parser.add_argument("--database-url")
+    asyncio.run(main(parser.parse_args()))
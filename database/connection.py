@@ -1,33 +1,111 @@
 # app/database/connection.py
+import asyncio
 import os
 import asyncpg
-from fastapi import HTTPException
+from fastapi import HTTPException, Request
 import logging
-from typing import AsyncGenerator
-from dotenv import load_dotenv
+from typing import AsyncGenerator, Dict, Optional
+from database.vector_codec import encode_vector, decode_vector
+from services.metrics import timed
 
 logger = logging.getLogger(__name__)
 
-async def get_db() -> AsyncGenerator[asyncpg.Connection, None]:
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+async def init_connection(conn: asyncpg.Connection) -> None:
+    """Run once for every new physical connection the pool opens."""
     try:
-        load_dotenv()
-        conn_str = os.getenv("DATABASE_URL")
-        conn = await asyncpg.connect(conn_str)
-        logger.info("Database connection established")
-        yield conn
-    except asyncpg.PostgresError as e:
-        logger.error(f"Database connection error: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Could not connect to database"
+        await conn.set_type_codec(
+            "vector",
+            schema=os.getenv("PGVECTOR_SCHEMA", "public"),
+            encoder=encode_vector,
+            decoder=decode_vector,
+            format="binary",
         )
+    except ValueError:
+        # The pgvector extension is not installed in this database, so
+        # there is no vector column to search yet.
+        logger.warning("pgvector type not found, vector codec not registered")
+
+
+def _search_settings() -> Dict[str, str]:
+    """Session defaults for pgvector ANN scans; these survive the pool's RESET ALL."""
+    settings = {}
+    if os.getenv("PGVECTOR_HNSW_EF_SEARCH"):
+        settings["hnsw.ef_search"] = os.getenv("PGVECTOR_HNSW_EF_SEARCH")
+    if os.getenv("PGVECTOR_IVFFLAT_PROBES"):
+        settings["ivfflat.probes"] = os.getenv("PGVECTOR_IVFFLAT_PROBES")
+    return settings
+
+
+async def create_pool() -> asyncpg.Pool:
+    pool = await asyncpg.create_pool(
+        os.getenv("DATABASE_URL"),
+        min_size=_env_int("DB_POOL_MIN_SIZE", 2),
+        max_size=_env_int("DB_POOL_MAX_SIZE", 10),
+        max_inactive_connection_lifetime=_env_float("DB_POOL_MAX_INACTIVE_LIFETIME", 300.0),
+        command_timeout=_env_float("DB_COMMAND_TIMEOUT", 30.0),
+        statement_cache_size=_env_int("DB_STATEMENT_CACHE_SIZE", 100),
+        init=init_connection,
+        server_settings=_search_settings() or None,
+    )
+    logger.info(
+        "Database pool created (min=%s, max=%s)",
+        pool.get_min_size(), pool.get_max_size()
+    )
+    return pool
+
+
+async def check_pool_health(pool: Optional[asyncpg.Pool]) -> bool:
+    if pool is None:
+        return False
+    try:
+        async with pool.acquire(timeout=_env_float("DB_HEALTH_CHECK_TIMEOUT", 2.0)) as conn:
+            return await conn.fetchval("SELECT 1") == 1
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        logger.error(f"Database health check failed: {str(e)}")
+        return False
+
+
+async def close_pool(pool: asyncpg.Pool) -> None:
+    """Wait for leased connections to be released, then terminate stragglers."""
+    try:
+        await asyncio.wait_for(pool.close(), timeout=_env_float("DB_POOL_CLOSE_TIMEOUT", 10.0))
+        logger.info("Database pool closed")
+    except asyncio.TimeoutError:
+        logger.warning("Database pool did not drain in time, terminating connections")
+        pool.terminate()
+
+
+def pool_acquire_timeout() -> float:
+    return _env_float("DB_POOL_ACQUIRE_TIMEOUT", 5.0)
+
+
+async def get_db(request: Request) -> AsyncGenerator[asyncpg.Connection, None]:
+    pool: asyncpg.Pool = request.app.state.db_pool
+    try:
+        with timed("db_acquire"):
+            conn = await pool.acquire(timeout=pool_acquire_timeout())
+    except asyncio.TimeoutError:
+        logger.error("Timed out waiting for a database connection")
+        raise HTTPException(
+            status_code=503,
+            detail="Database busy, please retry"
+        )
+    except (asyncpg.PostgresError, OSError) as e:
+        logger.error(f"Database connection error: {str(e)}")
         raise HTTPException(
             status_code=500,
-            detail="Internal server error"
+            detail="Could not connect to database"
         )
+    try:
+        yield conn
     finally:
-        if 'conn' in locals():
-            await conn.close()
-            logger.info("Database connection closed")
\ No newline at end of file
+        await pool.release(conn)
@@ -0,0 +1,393 @@
+"""Bulk-load blog documents into blog_embedding_oai_small.
+
+    python -m database.ingest docs.jsonl                 # incremental upsert
+    python -m database.ingest ./posts --full             # rebuild via staging table
+    python -m database.ingest docs.jsonl.gz --concurrency 8 --batch-size 512
+
+The source is a JSONL file (optionally gzipped) of ``{"documentid", "content"}``
+objects, or a directory of .md/.txt/.html files whose relative path is the
+documentid. Documents are streamed, split into overlapping chunks, and
+each chunk's md5 is compared with ``md5(content)`` of the rows already
+loaded, so unchanged chunks are never re-embedded. New chunks are embedded
+in concurrent batches, backing off on 429/5xx responses, and written with
+binary COPY.
+
+Incremental runs COPY straight into the live table and, once everything
+is loaded, delete chunks that are no longer part of a document they
+re-ingested. ``--full`` builds ``blog_embedding_oai_small_staging``
+instead: unchanged chunks are copied server-side from the live table,
+the live table's indexes, constraints and triggers are recreated on the
+staging table, and the two are swapped in one short transaction.
+Privileges are not copied.
+
+Both modes are resumable: rerunning after a failure skips every chunk
+whose hash is already in the target table (the staging table is kept
+until the swap succeeds; ``--restart`` drops it).
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, NamedTuple, Set, Tuple
+
+import asyncpg
+import openai
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from database.connection import init_connection
+from services.context_packer import estimate_tokens
+from services.embeddings import embedding_model
+from services.openai_client import create_openai_client
+
+logger = logging.getLogger(__name__)
+
+TABLE = "blog_embedding_oai_small"
+STAGING = f"{TABLE}_staging"
+COLUMNS = ["documentid", "content", "embedding"]
+SOURCE_EXTENSIONS = (".md", ".markdown", ".txt", ".html")
+
+
+class Chunk(NamedTuple):
+    documentid: str
+    content: str
+    hash: str
+    tokens: int
+
+
+def content_hash(text: str) -> str:
+    """Same digest as Postgres ``md5(content)``."""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def read_documents(source: str) -> Iterator[Tuple[str, str]]:
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(SOURCE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    with open(path, encoding="utf-8") as f:
+                        yield os.path.splitext(os.path.relpath(path, source))[0], f.read()
+        return
+    opener = gzip.open if source.endswith(".gz") else open
+    with opener(source, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                document = json.loads(line)
+                yield str(document["documentid"]), document["content"]
+
+
+def chunk_text(text: str, max_tokens: int = 400, overlap_tokens: int = 50) -> List[str]:
+    """Pack paragraphs into chunks of about ``max_tokens``, carrying ``overlap_tokens`` between them."""
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if estimate_tokens(" ".join(words)) <= max_tokens:
+            units.append(words)
+            continue
+        step = max(1, max_tokens * 4 // 6)  # ~6 characters per word including the space
+        units.extend(words[i:i + step] for i in range(0, len(words), step))
+
+    chunks, current = [], []
+    for words in units:
+        if current and estimate_tokens(" ".join(current + words)) > max_tokens:
+            chunks.append(" ".join(current))
+            carried = []
+            for word in reversed(current):
+                if estimate_tokens(" ".join([word] + carried)) > overlap_tokens:
+                    break
+                carried.insert(0, word)
+            current = carried
+        current = current + words
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+async def loaded_hashes(conn: asyncpg.Connection, table: str) -> Dict[str, Set[str]]:
+    hashes: Dict[str, Set[str]] = defaultdict(set)
+    async with conn.transaction():
+        async for row in conn.cursor(f"SELECT documentid, md5(content) AS hash FROM {table}", prefetch=10000):
+            hashes[row["documentid"]].add(row["hash"])
+    return hashes
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """Honour Retry-After when the API sends it, else exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        if response.headers.get("retry-after-ms"):
+            return float(response.headers["retry-after-ms"]) / 1000
+        if response.headers.get("retry-after", "").isdigit():
+            return float(response.headers["retry-after"])
+    return min(60.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class Progress:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.documents = 0
+        self.chunks = 0
+        self.skipped = 0
+        self.embedded = 0
+        self.tokens = 0
+        self.throttled = 0
+
+    def line(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return (f"{self.documents} documents, {self.chunks} chunks ({self.skipped} unchanged), "
+                f"{self.embedded} embedded, {self.embedded / elapsed:.1f} chunks/s, "
+                f"{self.tokens / elapsed:.0f} tokens/s, {self.throttled} throttled")
+
+
+class Ingestor:
+    def __init__(self, conn: asyncpg.Connection, client: AsyncOpenAI, full: bool = False,
+                 batch_size: int = 512, batch_tokens: int = 250_000, concurrency: int = 4,
+                 chunk_tokens: int = 400, overlap_tokens: int = 50, max_attempts: int = 8):
+        self.conn = conn
+        # Backoff is handled here so throttling is visible in the progress report
+        self.client = client.with_options(max_retries=0)
+        self.model = embedding_model()
+        self.full = full
+        self.target = STAGING if full else TABLE
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.concurrency = concurrency
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.max_attempts = max_attempts
+        self.progress = Progress()
+        self.live: Dict[str, Set[str]] = {}
+        self.loaded: Dict[str, Set[str]] = {}
+        self.keep: List[Tuple[str, str]] = []
+        self.stale: Dict[str, List[str]] = {}
+
+    async def embed(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        for attempt in range(self.max_attempts):
+            try:
+                response = await self.client.embeddings.create(input=texts, model=self.model)
+                data = sorted(response.data, key=lambda item: item.index)
+                return [item.embedding for item in data], response.usage.prompt_tokens
+            except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+                if attempt == self.max_attempts - 1:
+                    raise
+                self.progress.throttled += 1
+                delay = retry_delay(e, attempt)
+                logger.warning(f"Embedding batch failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def pending_chunks(self, source: str) -> Iterator[Chunk]:
+        for documentid, text in read_documents(source):
+            self.progress.documents += 1
+            chunks = {}
+            for content in chunk_text(text, self.chunk_tokens, self.overlap_tokens):
+                chunks.setdefault(content_hash(content), content)
+            live = self.live.get(documentid, set())
+            if not self.full and live - chunks.keys():
+                self.stale[documentid] = sorted(live - chunks.keys())
+            for digest, content in chunks.items():
+                self.progress.chunks += 1
+                if digest in self.loaded.get(documentid, ()):
+                    self.progress.skipped += 1
+                elif self.full and digest in live:
+                    self.keep.append((documentid, digest))
+                    self.progress.skipped += 1
+                else:
+                    yield Chunk(documentid, content, digest, estimate_tokens(content))
+
+    async def produce(self, source: str, batches: asyncio.Queue) -> None:
+        batch, tokens = [], 0
+        for chunk in self.pending_chunks(source):
+            if batch and (len(batch) >= self.batch_size or tokens + chunk.tokens > self.batch_tokens):
+                await batches.put(batch)
+                batch, tokens = [], 0
+            batch.append(chunk)
+            tokens += chunk.tokens
+        if batch:
+            await batches.put(batch)
+        for _ in range(self.concurrency):
+            await batches.put(None)
+
+    async def embed_batches(self, batches: asyncio.Queue, loads: asyncio.Queue) -> None:
+        while True:
+            batch = await batches.get()
+            if batch is None:
+                return
+            embeddings, tokens = await self.embed([chunk.content for chunk in batch])
+            self.progress.tokens += tokens
+            await loads.put([(c.documentid, c.content, e) for c, e in zip(batch, embeddings)])
+
+    async def load(self, loads: asyncio.Queue) -> None:
+        while True:
+            records = await loads.get()
+            if records is None:
+                return
+            await self.conn.copy_records_to_table(self.target, records=records, columns=COLUMNS)
+            self.progress.embedded += len(records)
+
+    async def report(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(self.progress.line())
+
+    async def run(self, source: str, report_interval: float = 10.0) -> Progress:
+        if self.full:
+            await self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {STAGING} (LIKE {TABLE} INCLUDING ALL EXCLUDING INDEXES)"
+            )
+        self.live = await loaded_hashes(self.conn, TABLE)
+        self.loaded = await loaded_hashes(self.conn, STAGING) if self.full else self.live
+
+        batches: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        loads: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.ensure_future(self.produce(source, batches))]
+        workers += [asyncio.ensure_future(self.embed_batches(batches, loads)) for _ in range(self.concurrency)]
+
+        async def feed() -> None:
+            await asyncio.gather(*workers)
+            await loads.put(None)
+
+        tasks = [asyncio.ensure_future(feed()), asyncio.ensure_future(self.load(loads))]
+        reporter = asyncio.ensure_future(self.report(report_interval))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in workers + tasks + [reporter]:
+                task.cancel()
+            await asyncio.gather(*workers, *tasks, reporter, return_exceptions=True)
+
+        if self.full:
+            await self.copy_unchanged()
+            await self.swap()
+        elif self.stale:
+            await self.conn.executemany(
+                f"DELETE FROM {TABLE} WHERE documentid = $1 AND md5(content) = ANY($2::text[])",
+                list(self.stale.items()),
+            )
+        logger.info(self.progress.line())
+        return self.progress
+
+    async def copy_unchanged(self) -> None:
+        """Carry unchanged chunks and their embeddings over from the live table in one scan."""
+        if not self.keep:
+            return
+        async with self.conn.transaction():
+            await self.conn.execute(
+                "CREATE TEMP TABLE ingest_keep (documentid text, hash text) ON COMMIT DROP"
+            )
+            await self.conn.copy_records_to_table("ingest_keep", records=self.keep)
+            copied = await self.conn.execute(f"""
+                INSERT INTO {STAGING} (documentid, content, embedding)
+                SELECT DISTINCT ON (l.documentid, k.hash) l.documentid, l.content, l.embedding
+                FROM {TABLE} l
+                JOIN ingest_keep k ON k.documentid = l.documentid::text AND k.hash = md5(l.content)
+            """)
+        logger.info(f"Reused embeddings for unchanged chunks: {copied}")
+
+    async def swap(self) -> None:
+        indexes = await self.conn.fetch("""
+            SELECT c.relname AS name, pg_get_indexdef(i.indexrelid) AS definition,
+                   con.conname AS constraint_name, pg_get_constraintdef(con.oid) AS constraint_definition
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            LEFT JOIN pg_constraint con ON con.conindid = i.indexrelid AND con.conrelid = i.indrelid
+            WHERE i.indrelid = $1::regclass
+        """, TABLE)
+        triggers = await self.conn.fetch(
+            "SELECT pg_get_triggerdef(oid) AS definition FROM pg_trigger WHERE tgrelid = $1::regclass AND NOT tgisinternal",
+            TABLE,
+        )
+        existing = {row["name"] for row in await self.conn.fetch(
+            "SELECT indexrelid::regclass::text AS name FROM pg_index WHERE indrelid = $1::regclass", STAGING
+        )}
+
+        started = time.perf_counter()
+        for index in indexes:
+            name = f"{index['name']}_staging"
+            if name in existing:
+                continue
+            if index["constraint_name"]:
+                await self.conn.execute(
+                    f"ALTER TABLE {STAGING} ADD CONSTRAINT {name} {index['constraint_definition']}"
+                )
+            else:
+                await self.conn.execute(re.sub(
+                    r"^CREATE (UNIQUE )?INDEX \S+ ON \S+", f"CREATE \\1INDEX {name} ON {STAGING}",
+                    index["definition"],
+                ))
+        await self.conn.execute(f"ANALYZE {STAGING}")
+        logger.info(f"Built {len(indexes)} indexes on {STAGING} in {time.perf_counter() - started:.1f}s")
+
+        async with self.conn.transaction():
+            await self.conn.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+            # LIKE ... INCLUDING ALL copies serial defaults that still use the live table's sequences
+            owned = await self.conn.fetch("""
+                SELECT d.objid::regclass::text AS sequence, a.attname AS column_name
+                FROM pg_depend d
+                JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+                JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+                WHERE d.refobjid = $1::regclass AND d.deptype = 'a'
+            """, TABLE)
+            # Triggers go on last so the bulk load did not fire them
+            for trigger in triggers:
+                await self.conn.execute(re.sub(r" ON \S+ ", f" ON {STAGING} ", trigger["definition"], count=1))
+            for index in indexes:
+                await self.conn.execute(f"ALTER INDEX {index['name']} RENAME TO {index['name']}_old")
+            await self.conn.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_old")
+            await self.conn.execute(f"ALTER TABLE {STAGING} RENAME TO {TABLE}")
+            for index in indexes:
+                # Renaming a constraint's index renames the constraint with it
+                await self.conn.execute(f"ALTER INDEX {index['name']}_staging RENAME TO {index['name']}")
+            for sequence in owned:
+                # Otherwise dropping the old table would drop (or be blocked by) the sequence
+                await self.conn.execute(
+                    f"ALTER SEQUENCE {sequence['sequence']} OWNED BY {TABLE}.{sequence['column_name']}"
+                )
+            await self.conn.execute(f"DROP TABLE {TABLE}_old")
+            await self.conn.execute("SELECT pg_notify('blog_embedding_changed', 'SWAP')")
+        logger.info(f"Swapped {STAGING} into {TABLE}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    conn = await asyncpg.connect(args.database_url or os.getenv("DATABASE_URL"))
+    await init_connection(conn)
+    client = create_openai_client()
+    try:
+        if args.restart:
+            await conn.execute(f"DROP TABLE IF EXISTS {STAGING}")
+        ingestor = Ingestor(
+            conn, client, full=args.full, batch_size=args.batch_size, batch_tokens=args.batch_tokens,
+            concurrency=args.concurrency, chunk_tokens=args.chunk_tokens, overlap_tokens=args.overlap_tokens,
+        )
+        progress = await ingestor.run(args.source, args.report_interval)
+        print(progress.line())
+    finally:
+        await client.close()
+        await conn.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="JSONL(.gz) file or directory of documents")
+    parser.add_argument("--full", action="store_true", help="rebuild through the staging table and swap")
+    parser.add_argument("--restart", action="store_true", help="drop a leftover staging table first")
+    parser.add_argument("--batch-size", type=int, default=512, help="inputs per embeddings request")
+    parser.add_argument("--batch-tokens", type=int, default=250_000, help="estimated tokens per embeddings request")
+    parser.add_argument("--concurrency", type=int, default=4, help="embeddings requests in flight")
+    parser.add_argument("--chunk-tokens", type=int, default=400)
+    parser.add_argument("--overlap-tokens", type=int, default=50)
+    parser.add_argument("--report-interval", type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument("--database-url")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,13 @@
+-- Notify the API (database/notifications.py) whenever the blog corpus changes
+-- so semantic answer caches can be invalidated.
+CREATE OR REPLACE FUNCTION notify_blog_embedding_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('blog_embedding_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS blog_embedding_changed ON blog_embedding_oai_small;
+CREATE TRIGGER blog_embedding_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON blog_embedding_oai_small
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_blog_embedding_changed();
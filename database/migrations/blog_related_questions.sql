@@ -0,0 +1,9 @@
+-- Related questions generated offline per document (python -m database.related_questions)
+-- and served by /blog/related-question through nearest-document lookup.
+CREATE TABLE IF NOT EXISTS blog_related_questions (
+    documentid   text PRIMARY KEY,
+    questions    text[] NOT NULL,
+    content_hash text NOT NULL,
+    model        text NOT NULL,
+    generated_at timestamptz NOT NULL DEFAULT now()
+);
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import os
+from typing import Callable, List, Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Raised by the trigger in database/migrations/blog_embedding_notify.sql
+CORPUS_CHANGED_CHANNEL = "blog_embedding_changed"
+
+
+class CorpusChangeListener:
+    """LISTEN for blog_embedding_oai_small changes on a dedicated connection.
+
+    Callbacks also fire when the connection drops, since notifications may
+    have been missed while it was down.
+    """
+
+    def __init__(self, callbacks: List[Callable[[], None]]):
+        self.callbacks = callbacks
+        self._conn: Optional[asyncpg.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    async def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        retry_delay = float(os.getenv("DB_LISTEN_RETRY_DELAY", "5"))
+        while not self._closing:
+            try:
+                self._conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
+                lost = asyncio.Event()
+                self._conn.add_termination_listener(lambda conn: lost.set())
+                await self._conn.add_listener(CORPUS_CHANGED_CHANNEL, self._on_notify)
+                logger.info(f"Listening on {CORPUS_CHANGED_CHANNEL}")
+                await lost.wait()
+                logger.warning("Corpus change listener connection lost")
+                self._fire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Corpus change listener unavailable: {str(e)}")
+            await asyncio.sleep(retry_delay)
+
+    def _on_notify(self, conn, pid, channel, payload) -> None:
+        logger.info(f"Corpus changed ({payload})")
+        self._fire()
+
+    def _fire(self) -> None:
+        for callback in self.callbacks:
+            callback()
+
+    async def stop(self) -> None:
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
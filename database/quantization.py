@@ -0,0 +1,65 @@
+"""Compact embedding representations for two-stage similarity search.
+
+The compact vectors are pgvector expressions over the existing
+``embedding`` column, so they exist only inside expression indexes (see
+``python -m database.ann_index create --quantization ...``) and need no
+extra storage column or ingestion change:
+
+    halfvec    full dimensions at half precision          halfvec_cosine_ops
+    subvector  first SEARCH_REDUCED_DIMENSIONS dims as     halfvec_cosine_ops
+               halfvec (text-embedding-3-* are Matryoshka
+               embeddings, so a prefix is itself an embedding)
+    binary     one bit per dimension, Hamming distance    bit_hamming_ops
+
+A search orders by the compact expression to pick candidates through the
+index, then re-ranks them on the full vectors with ``<=>``. Requires
+pgvector 0.7+.
+"""
+import os
+from typing import NamedTuple, Optional
+
+SEARCH_MODES = ("exact", "halfvec", "subvector", "binary")
+
+
+class Quantization(NamedTuple):
+    expression: str  # indexed expression over the embedding column
+    query: str       # the same transform applied to a query vector, with {q} as the placeholder
+    operator: str
+    opclass: str
+
+
+def embedding_dimensions() -> int:
+    return int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+
+
+def reduced_dimensions() -> int:
+    return int(os.getenv("SEARCH_REDUCED_DIMENSIONS", "512"))
+
+
+def search_mode() -> str:
+    return os.getenv("SEARCH_MODE", "exact")
+
+
+def rerank_candidates(limit: int) -> int:
+    """Candidates fetched before re-ranking; keep it at or below hnsw.ef_search."""
+    return max(limit, int(os.getenv("SEARCH_RERANK_CANDIDATES", "40")))
+
+
+def quantization(mode: str, dimensions: Optional[int] = None, reduced: Optional[int] = None) -> Quantization:
+    dimensions = dimensions or embedding_dimensions()
+    reduced = reduced or reduced_dimensions()
+    if mode == "halfvec":
+        return Quantization(
+            f"(embedding::halfvec({dimensions}))", f"{{q}}::halfvec({dimensions})", "<=>", "halfvec_cosine_ops"
+        )
+    if mode == "subvector":
+        return Quantization(
+            f"(subvector(embedding, 1, {reduced})::halfvec({reduced}))",
+            f"subvector({{q}}, 1, {reduced})::halfvec({reduced})", "<=>", "halfvec_cosine_ops"
+        )
+    if mode == "binary":
+        return Quantization(
+            f"(binary_quantize(embedding)::bit({dimensions}))",
+            f"binary_quantize({{q}})::bit({dimensions})", "<~>", "bit_hamming_ops"
+        )
+    raise ValueError(f"Unknown search mode: {mode}")
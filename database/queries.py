@@ -1,16 +1,74 @@
-from typing import List
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
 import asyncpg
 from models.search import Context
+from database.quantization import quantization, rerank_candidates, search_mode
+from database.vector_index import get_vector_index
 
 
-async def perform_similarity_search(conn: asyncpg.Connection, vector_string: str, limit: int) -> List[Context]:
-    rows = await conn.fetch("""
-        SELECT documentid, content, embedding <=> $1::vector AS similarity
+SIMILARITY_SQL = """
+    SELECT documentid, content, embedding <=> $1::vector AS similarity
+    FROM blog_embedding_oai_small
+    ORDER BY similarity ASC
+    LIMIT $2
+"""
+
+
+RERANK_SQL = """
+    SELECT documentid, content, embedding <=> $1::vector AS similarity
+    FROM (
+        SELECT documentid, content, embedding
         FROM blog_embedding_oai_small
-        ORDER BY similarity ASC
-        LIMIT $2
-    """, vector_string, limit)
+        ORDER BY {expression} {operator} {query}
+        LIMIT $3
+    ) candidates
+    ORDER BY similarity ASC
+    LIMIT $2
+"""
+
+
+def _similarity_query(mode: Optional[str], limit: int) -> Tuple[str, tuple]:
+    """SQL and trailing arguments for a search mode (see database.quantization)."""
+    mode = mode or search_mode()
+    if mode == "exact":
+        return SIMILARITY_SQL, ()
+    compact = quantization(mode)
+    sql = RERANK_SQL.format(
+        expression=compact.expression, operator=compact.operator, query=compact.query.format(q="$1::vector")
+    )
+    return sql, (rerank_candidates(limit),)
+
+
+async def apply_search_tuning(conn: asyncpg.Connection, ef_search: Optional[int] = None,
+                              probes: Optional[int] = None) -> None:
+    """SET LOCAL the ANN recall knobs; must run inside a transaction."""
+    if ef_search is not None:
+        await conn.execute(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+    if probes is not None:
+        await conn.execute(f"SET LOCAL ivfflat.probes = {int(probes)}")
+
+
+async def perform_similarity_search(conn: asyncpg.Connection, query_embedding: Sequence[float], limit: int,
+                                    ef_search: Optional[int] = None, probes: Optional[int] = None,
+                                    mode: Optional[str] = None) -> List[Context]:
+    """Top ``limit`` chunks by cosine distance.
+
+    ``mode`` (default SEARCH_MODE) is "exact" or a compact representation
+    from database.quantization, which picks SEARCH_RERANK_CANDIDATES
+    candidates through its expression index and re-ranks them exactly.
+    """
+    index = get_vector_index()
+    if index is not None:
+        # Exact in-process search; the ANN knobs do not apply
+        return (await index.search([query_embedding], limit))[0]
+    sql, extra = _similarity_query(mode, limit)
+    if ef_search is None and probes is None:
+        # Pool-wide defaults come from server_settings (see database.connection)
+        rows = await conn.fetch(sql, query_embedding, limit, *extra)
+    else:
+        async with conn.transaction():
+            await apply_search_tuning(conn, ef_search, probes)
+            rows = await conn.fetch(sql, query_embedding, limit, *extra)
 
     return [
         Context(
@@ -19,3 +77,126 @@ async def perform_similarity_search(conn: asyncpg.Connection, vector_string: str
             similarity=row['similarity']
         ) for row in rows
     ]
+
+
+BATCH_SIMILARITY_SQL = """
+    SELECT q.ord, r.documentid, r.content, r.similarity
+    FROM unnest($1::vector[]) WITH ORDINALITY AS q(query_embedding, ord)
+    CROSS JOIN LATERAL (
+        SELECT documentid, content, embedding <=> q.query_embedding AS similarity
+        FROM blog_embedding_oai_small
+        ORDER BY similarity ASC
+        LIMIT $2
+    ) r
+"""
+
+BATCH_RERANK_SQL = """
+    SELECT q.ord, r.documentid, r.content, r.similarity
+    FROM unnest($1::vector[]) WITH ORDINALITY AS q(query_embedding, ord)
+    CROSS JOIN LATERAL (
+        SELECT documentid, content, embedding <=> q.query_embedding AS similarity
+        FROM (
+            SELECT documentid, content, embedding
+            FROM blog_embedding_oai_small
+            ORDER BY {expression} {operator} {query}
+            LIMIT $3
+        ) candidates
+        ORDER BY similarity ASC
+        LIMIT $2
+    ) r
+"""
+
+
+# Only for fully fetched results: the sort blocks until every LATERAL search is done
+BATCH_ORDER_BY = "    ORDER BY q.ord, r.similarity\n"
+
+
+def _batch_similarity_query(mode: Optional[str], limit: int, ordered: bool = True) -> Tuple[str, tuple]:
+    mode = mode or search_mode()
+    if mode == "exact":
+        sql, extra = BATCH_SIMILARITY_SQL, ()
+    else:
+        compact = quantization(mode)
+        sql = BATCH_RERANK_SQL.format(
+            expression=compact.expression, operator=compact.operator, query=compact.query.format(q="q.query_embedding")
+        )
+        extra = (rerank_candidates(limit),)
+    return (sql + BATCH_ORDER_BY if ordered else sql), extra
+
+
+async def iter_batch_similarity_search(
+    conn: asyncpg.Connection, query_embeddings: Sequence[Sequence[float]], limit: int,
+    ef_search: Optional[int] = None, probes: Optional[int] = None, mode: Optional[str] = None
+) -> AsyncIterator[Tuple[int, List[Context]]]:
+    """Yield (query index, hits) per query, in order, as the single LATERAL query produces them.
+
+    The query has no outer ORDER BY, so rows leave the nested-loop join
+    in ``ord`` order as each query's search finishes; hits are sorted per
+    query here. The cursor fetches ``limit`` rows per round trip, so a
+    query's hits are sent without waiting for the searches after it.
+    """
+    vector_index = get_vector_index()
+    if vector_index is not None:
+        for position, hits in enumerate(await vector_index.search(query_embeddings, limit)):
+            yield position, hits
+        return
+    sql, extra = _batch_similarity_query(mode, limit, ordered=False)
+    current, hits = 0, []
+    async with conn.transaction():
+        await apply_search_tuning(conn, ef_search, probes)
+        async for row in conn.cursor(sql, list(query_embeddings), limit, *extra, prefetch=max(1, limit)):
+            position = row['ord'] - 1
+            if position < current:
+                raise RuntimeError(f"Batch search returned query {position} after query {current}")
+            while current < position:
+                yield current, sorted(hits, key=lambda c: c.similarity)
+                current, hits = current + 1, []
+            hits.append(Context(
+                documentid=row['documentid'],
+                content=row['content'],
+                similarity=row['similarity']
+            ))
+            if len(hits) == limit:
+                # LATERAL ... LIMIT caps each query, so this one is complete
+                yield current, sorted(hits, key=lambda c: c.similarity)
+                current, hits = current + 1, []
+    while current < len(query_embeddings):
+        yield current, sorted(hits, key=lambda c: c.similarity)
+        current, hits = current + 1, []
+
+
+async def perform_batch_similarity_search(
+    conn: asyncpg.Connection, query_embeddings: Sequence[Sequence[float]], limit: int,
+    ef_search: Optional[int] = None, probes: Optional[int] = None, mode: Optional[str] = None
+) -> List[List[Context]]:
+    index = get_vector_index()
+    if index is not None:
+        return await index.search(query_embeddings, limit)
+    sql, extra = _batch_similarity_query(mode, limit)
+    if ef_search is None and probes is None:
+        rows = await conn.fetch(sql, list(query_embeddings), limit, *extra)
+    else:
+        async with conn.transaction():
+            await apply_search_tuning(conn, ef_search, probes)
+            rows = await conn.fetch(sql, list(query_embeddings), limit, *extra)
+    results: List[List[Context]] = [[] for _ in query_embeddings]
+    for row in rows:
+        results[row['ord'] - 1].append(Context(
+            documentid=row['documentid'],
+            content=row['content'],
+            similarity=row['similarity']
+        ))
+    return results
+
+
+RELATED_QUESTIONS_SQL = """
+    SELECT documentid, questions
+    FROM blog_related_questions
+    WHERE documentid = ANY($1::text[])
+"""
+
+
+async def fetch_related_questions(conn: asyncpg.Connection, documentids: Sequence[str]) -> Dict[str, List[str]]:
+    """Precomputed related questions (see database.related_questions) for the given documents."""
+    rows = await conn.fetch(RELATED_QUESTIONS_SQL, list(documentids))
+    return {row['documentid']: list(row['questions']) for row in rows}
@@ -0,0 +1,152 @@
+"""Precompute related questions for every document in blog_embedding_oai_small.
+
+    python -m database.related_questions
+    python -m database.related_questions --concurrency 8 --force
+
+Chunks are streamed from a cursor one document at a time, in the order
+they were loaded (ctid), with the overlap database.ingest carries between
+neighbouring chunks removed. Each document's text, truncated to
+--max-tokens, is sent to the chat model once; the questions land in
+blog_related_questions (database/migrations/blog_related_questions.sql)
+with the md5 of the whole document text. Reruns skip documents whose text
+is unchanged, so the job can be scheduled after every ingestion and
+resumes where a failed run stopped. Rows for deleted documents are
+removed.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, Tuple
+
+import asyncpg
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from services.openai_client import create_openai_client
+from services.related_questions import document_messages, parse_questions
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_SQL = """
+    SELECT documentid::text AS documentid, content
+    FROM blog_embedding_oai_small
+    ORDER BY documentid, ctid
+"""
+
+HASHES_SQL = "SELECT documentid, content_hash FROM blog_related_questions"
+
+UPSERT_SQL = """
+    INSERT INTO blog_related_questions (documentid, questions, content_hash, model, generated_at)
+    VALUES ($1, $2, $3, $4, now())
+    ON CONFLICT (documentid) DO UPDATE
+    SET questions = EXCLUDED.questions, content_hash = EXCLUDED.content_hash,
+        model = EXCLUDED.model, generated_at = EXCLUDED.generated_at
+"""
+
+PRUNE_SQL = """
+    DELETE FROM blog_related_questions r
+    WHERE NOT EXISTS (SELECT 1 FROM blog_embedding_oai_small e WHERE e.documentid::text = r.documentid)
+"""
+
+
+def strip_overlap(previous: str, chunk: str, max_words: int = 200) -> str:
+    """``chunk`` without the words it repeats from the end of ``previous``."""
+    tail = previous.split()[-max_words:]
+    words = chunk.split()
+    for size in range(min(len(tail), len(words)), 0, -1):
+        if tail[-size:] == words[:size]:
+            return " ".join(words[size:])
+    return chunk
+
+
+async def iter_documents(conn: asyncpg.Connection, max_chars: int) -> AsyncIterator[Tuple[str, str, str]]:
+    """(documentid, text truncated to ``max_chars``, md5 of the full text) per document."""
+    documentid, parts, size, digest, previous = None, [], 0, None, ""
+    async with conn.transaction():
+        async for row in conn.cursor(CHUNKS_SQL):
+            if row["documentid"] != documentid:
+                if documentid is not None:
+                    yield documentid, "\n\n".join(parts)[:max_chars], digest.hexdigest()
+                documentid, parts, size, digest, previous = row["documentid"], [], 0, hashlib.md5(), ""
+            text = strip_overlap(previous, row["content"]) if previous else row["content"]
+            previous = row["content"]
+            digest.update(("\n\n" + text if size else text).encode("utf-8"))
+            if size < max_chars:
+                parts.append(text)
+            size += len(text) + 2
+    if documentid is not None:
+        yield documentid, "\n\n".join(parts)[:max_chars], digest.hexdigest()
+
+
+async def generate(client: AsyncOpenAI, model: str, content: str) -> list:
+    completion = await client.chat.completions.create(
+        model=model,
+        messages=document_messages(content),  # type: ignore
+        temperature=0.7,
+        max_tokens=256
+    )
+    return parse_questions(completion.choices[0].message.content or "")
+
+
+async def main(args: argparse.Namespace) -> None:
+    pool = await asyncpg.create_pool(args.database_url or os.getenv("DATABASE_URL"), min_size=1,
+                                     max_size=args.concurrency + 2)
+    client = create_openai_client()
+    model = os.getenv("CHAT_COMPLETION_MODEL", "gpt-4.1-nano-2025-04-14")
+    semaphore = asyncio.Semaphore(args.concurrency)
+    started = time.perf_counter()
+    done = failed = 0
+
+    async def process(documentid: str, content: str, content_hash: str) -> None:
+        nonlocal done, failed
+        try:
+            questions = await generate(client, model, content)
+        except Exception as e:
+            failed += 1
+            logger.warning(f"{documentid}: {str(e)}")
+            return
+        finally:
+            semaphore.release()
+        if questions:
+            await pool.execute(UPSERT_SQL, documentid, questions, content_hash, model)
+            done += 1
+
+    tasks = set()
+    try:
+        deleted = await pool.execute(PRUNE_SQL)
+        logger.info(f"{deleted} stale rows removed")
+        known: Dict[str, str] = {row["documentid"]: row["content_hash"] for row in await pool.fetch(HASHES_SQL)}
+        skipped = 0
+        async with pool.acquire() as conn:
+            async for documentid, content, content_hash in iter_documents(conn, args.max_tokens * 4):
+                if not args.force and known.get(documentid) == content_hash:
+                    skipped += 1
+                    continue
+                # Holding a slot before reading on keeps at most --concurrency documents in memory
+                await semaphore.acquire()
+                task = asyncio.ensure_future(process(documentid, content, content_hash))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        print(f"{done} documents updated, {skipped} unchanged, {failed} failed in {elapsed:.1f}s "
+              f"({done / max(elapsed, 1e-9):.1f} docs/s)")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await client.close()
+        await pool.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="chat completions in flight")
+    parser.add_argument("--max-tokens", type=int, default=3000, help="approximate article tokens sent per document")
+    parser.add_argument("--force", action="store_true", help="regenerate every document")
+    parser.add_argument("--database-url")
+    asyncio.run(main(parser.parse_args()))
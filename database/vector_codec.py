@@ -0,0 +1,25 @@
+import struct
+import sys
+from array import array
+from typing import Sequence
+
+# pgvector binary wire format: uint16 dimensions, uint16 unused, then
+# big-endian float32 values.
+_HEADER = struct.Struct(">HH")
+_SWAP = sys.byteorder == "little"
+
+
+def encode_vector(value: Sequence[float]) -> bytes:
+    vector = array("f", value)
+    if _SWAP:
+        vector.byteswap()
+    return _HEADER.pack(len(vector), 0) + vector.tobytes()
+
+
+def decode_vector(data: bytes) -> array:
+    dim, _ = _HEADER.unpack_from(data)
+    vector = array("f")
+    vector.frombytes(data[_HEADER.size:_HEADER.size + 4 * dim])
+    if _SWAP:
+        vector.byteswap()
+    return vector
@@ -0,0 +1,335 @@
+"""In-process, memory-mapped NumPy search backend for blog_embedding_oai_small.
+
+Enabled with ``SEARCH_BACKEND=numpy``; Postgres stays the default. The
+corpus is mirrored into flat files under ``VECTOR_INDEX_PATH``:
+
+    CURRENT                 name of the live generation directory
+    gen-<ts>/meta.json      row count, dimension and xmin watermark
+    gen-<ts>/embeddings.f32 (n, dim) L2-normalised float32 matrix
+    gen-<ts>/{documentids,contents}.{bin,idx}
+                            UTF-8 blobs plus int64 offset arrays
+
+Every uvicorn worker maps the same files read-only, so the page cache
+holds one copy of the corpus regardless of worker count. One worker at a
+time (``flock`` on ``.lock``) refreshes: rows whose ``xmin`` is newer than
+the watermark are appended in place, and readers pick up the larger row
+count from meta.json. Deletes, updates and table swaps show up as a row
+count mismatch and trigger a full rebuild into a new generation, which
+is published by atomically replacing CURRENT.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+from typing import List, Optional, Sequence
+
+import asyncpg
+import numpy as np
+
+from models.search import Context
+
+logger = logging.getLogger(__name__)
+
+ROWS_SQL = """
+    SELECT documentid, content, embedding, xmin::text::bigint AS row_xmin
+    FROM blog_embedding_oai_small
+"""
+
+# Above this many matrix elements a search moves off the event loop
+_THREAD_THRESHOLD = 2_000_000
+
+
+class _Generation:
+    """Read-only mapping of one generation directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        n, dim = self.meta["rows"], self.meta["dim"]
+        self.rows = n
+        self.embeddings = (
+            np.memmap(os.path.join(path, "embeddings.f32"), dtype=np.float32, mode="r", shape=(n, dim))
+            if n else np.zeros((0, dim), dtype=np.float32)
+        )
+        self.documentids = self._strings("documentids", n)
+        self.contents = self._strings("contents", n)
+
+    def _strings(self, name: str, n: int):
+        offsets = np.memmap(os.path.join(self.path, f"{name}.idx"), dtype=np.int64, mode="r", shape=(n + 1,))
+        size = int(offsets[n])
+        blob = np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=np.uint8, mode="r", shape=(size,)) if size else b""
+        return offsets, blob
+
+    @staticmethod
+    def string(table, i: int) -> str:
+        offsets, blob = table
+        return bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+
+class _Writer:
+    """Appends rows to a generation directory."""
+
+    def __init__(self, path: str, dim: int, rows: int = 0):
+        self.path = path
+        self.dim = dim
+        self.rows = rows
+        self._offsets = {}
+        for name in ("documentids", "contents"):
+            idx = os.path.join(path, f"{name}.idx")
+            if rows == 0:
+                np.zeros(1, dtype=np.int64).tofile(idx)
+                open(os.path.join(path, f"{name}.bin"), "wb").close()
+                self._offsets[name] = 0
+            else:
+                self._offsets[name] = int(np.memmap(idx, dtype=np.int64, mode="r", shape=(rows + 1,))[rows])
+                # Drop anything an interrupted append wrote past the published row count
+                os.truncate(idx, (rows + 1) * 8)
+                os.truncate(os.path.join(path, f"{name}.bin"), self._offsets[name])
+        if rows == 0:
+            open(os.path.join(path, "embeddings.f32"), "wb").close()
+        else:
+            os.truncate(os.path.join(path, "embeddings.f32"), rows * dim * 4)
+
+    def append(self, records: List[asyncpg.Record]) -> None:
+        vectors = np.asarray([np.asarray(r["embedding"], dtype=np.float32) for r in records], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        with open(os.path.join(self.path, "embeddings.f32"), "ab") as f:
+            vectors.tofile(f)
+        for name, key in (("documentids", "documentid"), ("contents", "content")):
+            encoded = [str(r[key]).encode("utf-8") for r in records]
+            ends = self._offsets[name] + np.cumsum([len(e) for e in encoded], dtype=np.int64)
+            with open(os.path.join(self.path, f"{name}.bin"), "ab") as f:
+                f.write(b"".join(encoded))
+            with open(os.path.join(self.path, f"{name}.idx"), "ab") as f:
+                ends.tofile(f)
+            self._offsets[name] = int(ends[-1]) if len(ends) else self._offsets[name]
+        self.rows += len(records)
+
+    def publish(self, watermark: int) -> None:
+        meta = {"rows": self.rows, "dim": self.dim, "watermark": watermark, "updated_at": time.time()}
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+
+class NumpyVectorIndex:
+    def __init__(self, path: str, refresh_interval: float = 300.0,
+                 full_refresh_interval: float = 86400.0, batch_rows: int = 5000):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self.batch_rows = batch_rows
+        self._generation: Optional[_Generation] = None
+        self._task: Optional[asyncio.Task] = None
+        self.searches = 0
+        self.appends = 0
+        self.rebuilds = 0
+        os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "NumpyVectorIndex":
+        return cls(
+            os.getenv("VECTOR_INDEX_PATH", "./vector_index"),
+            refresh_interval=float(os.getenv("VECTOR_INDEX_REFRESH_INTERVAL", "300")),
+            full_refresh_interval=float(os.getenv("VECTOR_INDEX_FULL_REFRESH_INTERVAL", "86400")),
+        )
+
+    @property
+    def rows(self) -> int:
+        return self._generation.rows if self._generation else 0
+
+    def stats(self) -> dict:
+        generation = self._generation
+        return {
+            "rows": self.rows,
+            "dim": generation.meta["dim"] if generation else 0,
+            "searches": self.searches,
+            "appends": self.appends,
+            "rebuilds": self.rebuilds,
+            "age_seconds": round(time.time() - generation.meta["updated_at"], 1) if generation else 0,
+        }
+
+    # -- reading ---------------------------------------------------------
+
+    def _current_path(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                return os.path.join(self.path, f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def reload(self) -> bool:
+        """Remap if another worker published new rows or a new generation."""
+        path = self._current_path()
+        if path is None:
+            return False
+        with open(os.path.join(path, "meta.json")) as f:
+            rows = json.load(f)["rows"]
+        current = self._generation
+        if current is None or current.path != path or current.rows != rows:
+            self._generation = _Generation(path)
+            logger.info(f"Vector index mapped: {self._generation.rows} rows from {path}")
+            return True
+        return False
+
+    def _search_sync(self, queries: np.ndarray, limit: int) -> List[List[Context]]:
+        generation = self._generation
+        if generation is None or generation.rows == 0:
+            return [[] for _ in range(len(queries))]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        distances = 1.0 - generation.embeddings @ queries.T  # (rows, batch)
+        k = min(limit, generation.rows)
+        top = np.argpartition(distances, k - 1, axis=0)[:k]
+        results = []
+        for column in range(queries.shape[0]):
+            candidates = top[:, column]
+            ordered = candidates[np.argsort(distances[candidates, column])]
+            results.append([
+                Context(
+                    documentid=_Generation.string(generation.documentids, int(i)),
+                    content=_Generation.string(generation.contents, int(i)),
+                    similarity=float(distances[i, column]),
+                )
+                for i in ordered
+            ])
+        return results
+
+    async def search(self, query_embeddings: Sequence[Sequence[float]], limit: int) -> List[List[Context]]:
+        """Top-k cosine search for a batch of queries with one matrix multiply."""
+        queries = np.asarray([np.asarray(q, dtype=np.float32) for q in query_embeddings], dtype=np.float32)
+        self.searches += len(queries)
+        generation = self._generation
+        if generation is not None and generation.embeddings.size * len(queries) > _THREAD_THRESHOLD:
+            return await asyncio.to_thread(self._search_sync, queries, limit)
+        return self._search_sync(queries, limit)
+
+    # -- writing ---------------------------------------------------------
+
+    async def _stream_rows(self, conn: asyncpg.Connection, writer_factory, where: str = "", *args) -> tuple:
+        writer, watermark, batch = None, 0, []
+        async with conn.transaction():
+            async for record in conn.cursor(ROWS_SQL + where, *args, prefetch=self.batch_rows):
+                if writer is None:
+                    writer = writer_factory(len(record["embedding"]))
+                batch.append(record)
+                watermark = max(watermark, record["row_xmin"])
+                if len(batch) >= self.batch_rows:
+                    # Conversion, normalisation and file writes stay off the event loop
+                    await asyncio.to_thread(writer.append, batch)
+                    batch = []
+        if batch:
+            await asyncio.to_thread(writer.append, batch)
+        return writer, watermark
+
+    async def rebuild(self, conn: asyncpg.Connection) -> None:
+        started = time.perf_counter()
+        name = f"gen-{int(time.time() * 1000)}"
+        path = os.path.join(self.path, name)
+        os.makedirs(path)
+        writer, watermark = await self._stream_rows(conn, lambda dim: _Writer(path, dim))
+        if writer is None:
+            writer = _Writer(path, int(os.getenv("EMBEDDING_DIMENSIONS", "1536")))
+        await asyncio.to_thread(writer.publish, watermark)
+        previous = self._current_path()
+        tmp = os.path.join(self.path, "CURRENT.tmp")
+        with open(tmp, "w") as f:
+            f.write(name)
+        os.replace(tmp, os.path.join(self.path, "CURRENT"))
+        if previous is not None:
+            # Workers still mapping the old files keep them alive until they remap
+            await asyncio.to_thread(shutil.rmtree, previous, ignore_errors=True)
+        self.rebuilds += 1
+        logger.info(f"Vector index rebuilt: {writer.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    async def refresh(self, conn: asyncpg.Connection, full: bool = False) -> None:
+        """Append new rows, or rebuild when rows were deleted/updated or ``full`` is set."""
+        with open(os.path.join(self.path, ".lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # another worker is refreshing; we remap afterwards
+            try:
+                path = self._current_path()
+                if full or path is None:
+                    await self.rebuild(conn)
+                    return
+                with open(os.path.join(path, "meta.json")) as f:
+                    meta = json.load(f)
+                writer, watermark = await self._stream_rows(
+                    conn, lambda dim: _Writer(path, meta["dim"], meta["rows"]),
+                    " WHERE xmin::text::bigint > $1", meta["watermark"]
+                )
+                if writer is not None:
+                    await asyncio.to_thread(writer.publish, max(watermark, meta["watermark"]))
+                    self.appends += 1
+                    logger.info(f"Vector index appended {writer.rows - meta['rows']} rows")
+                rows = writer.rows if writer is not None else meta["rows"]
+                if rows != await conn.fetchval("SELECT count(*) FROM blog_embedding_oai_small"):
+                    await self.rebuild(conn)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # -- lifecycle -------------------------------------------------------
+
+    async def start(self, pool: asyncpg.Pool) -> None:
+        if self._current_path() is None:
+            async with pool.acquire() as conn:
+                await self.refresh(conn, full=True)
+            # Another worker may hold the lock mid-build; wait for it to publish
+            while self._current_path() is None:
+                await asyncio.sleep(0.5)
+        self.reload()
+        self._task = asyncio.ensure_future(self._refresh_loop(pool))
+
+    async def _refresh_loop(self, pool: asyncpg.Pool) -> None:
+        last_full = time.monotonic()
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                full = time.monotonic() - last_full > self.full_refresh_interval
+                async with pool.acquire() as conn:
+                    await self.refresh(conn, full=full)
+                if full:
+                    last_full = time.monotonic()
+                self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Vector index refresh failed: {str(e)}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+_vector_index: Optional[NumpyVectorIndex] = None
+
+
+def get_vector_index() -> Optional[NumpyVectorIndex]:
+    """The in-process index when SEARCH_BACKEND=numpy and it has been started, else None."""
+    return _vector_index
+
+
+async def start_vector_index(pool: asyncpg.Pool) -> Optional[NumpyVectorIndex]:
+    global _vector_index
+    if os.getenv("SEARCH_BACKEND", "postgres") != "numpy":
+        return None
+    index = NumpyVectorIndex.from_env()
+    await index.start(pool)
+    _vector_index = index
+    return index
+
+
+async def stop_vector_index() -> None:
+    global _vector_index
+    if _vector_index is not None:
+        await _vector_index.stop()
+        _vector_index = None
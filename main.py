@@ -1,5 +1,14 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routers import search_router
+from routers import search_router, health_router, metrics_router
+from database.connection import create_pool, close_pool
+from database.vector_index import start_vector_index, stop_vector_index
+from services.openai_client import create_openai_client, close_openai_client
+from services.embedding_cache import close_embedding_cache
+from services.answer_cache import invalidate_answer_caches
+from services.product_catalogue import warm_product_catalogue
+from database.notifications import CorpusChangeListener
+from services.metrics import MetricsMiddleware
 from dotenv import load_dotenv
 import uvicorn
 import os
@@ -7,7 +16,27 @@ from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.db_pool = await create_pool()
+    # No-op unless SEARCH_BACKEND=numpy
+    await start_vector_index(app.state.db_pool)
+    app.state.openai_client = create_openai_client()
+    await warm_product_catalogue(app.state.openai_client)
+    app.state.corpus_listener = CorpusChangeListener([invalidate_answer_caches])
+    await app.state.corpus_listener.start()
+    try:
+        yield
+    finally:
+        await app.state.corpus_listener.stop()
+        await stop_vector_index()
+        await close_openai_client(app.state.openai_client)
+        close_embedding_cache()
+        await close_pool(app.state.db_pool)
+
+
+app = FastAPI(lifespan=lifespan)
 
     # Add CORS middleware to allow all origins, methods, and headers
 app.add_middleware(
@@ -17,7 +46,11 @@ app.add_middleware(
         allow_methods=["*"],
         allow_headers=["*"],
 )
+# Outermost, so request latency and Server-Timing cover the whole stack
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(search_router.router)
+app.include_router(health_router.router)
+app.include_router(metrics_router.router)
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=52059)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Annotated, List, Optional
 
 
 class Query(BaseModel):
@@ -35,6 +35,20 @@ class SearchResponse(BaseModel):
     results: List[Context]
 
 
+class BatchQuery(BaseModel):
+    queries: List[Annotated[str, Field(min_length=3)]] = Field(..., min_length=1, max_length=100)
+    limit: int = Field(5, ge=1, le=50)
+
+
+class QuerySearchResponse(SearchResponse):
+    query: str
+
+
+class BatchSearchResponse(BaseModel):
+    message: str
+    results: List[QuerySearchResponse]
+
+
 class RelatedQuestionRequest(BaseModel):
     question: str = Field(..., min_length=3)
     context: Optional[str] = None
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from database.connection import check_pool_health
+from database.vector_index import get_vector_index
+from services.embedding_cache import get_embedding_cache
+from services.embedding_batcher import get_embedding_batcher
+from services.answer_cache import get_answer_cache, get_stream_answer_cache
+from services.product_catalogue import get_product_catalogue
+from services.related_questions import get_related_question_cache
+from services.admission import admission_stats_by_model
+from controllers.search_controller import ai_response_flight
+from controllers.stream_controller import stream_flight
+
+
+router = APIRouter()
+
+@router.get("/health")
+async def health(request: Request):
+    pool = getattr(request.app.state, "db_pool", None)
+    healthy = await check_pool_health(pool)
+    body = {"status": "ok" if healthy else "unavailable"}
+    if pool is not None:
+        body["pool"] = {
+            "size": pool.get_size(),
+            "idle": pool.get_idle_size(),
+            "max_size": pool.get_max_size(),
+        }
+    index = get_vector_index()
+    if index is not None:
+        body["vector_index"] = index.stats()
+    body["embedding_cache"] = get_embedding_cache().stats()
+    client = getattr(request.app.state, "openai_client", None)
+    if client is not None:
+        body["embedding_batcher"] = get_embedding_batcher(client).stats()
+    body["answer_cache"] = {
+        "ai_response": get_answer_cache().stats(),
+        "ai_stream": get_stream_answer_cache().stats(),
+    }
+    body["product_catalogue"] = get_product_catalogue().stats()
+    body["related_question_cache"] = get_related_question_cache().stats()
+    body["admission"] = admission_stats_by_model()
+    body["singleflight"] = {
+        "ai_response": ai_response_flight.stats(),
+        "ai_stream": stream_flight.stats(),
+    }
+    return JSONResponse(body, status_code=200 if healthy else 503)
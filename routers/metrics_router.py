@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+from services.metrics import register_collector, render_metrics, stats_collector
+from services.embedding_cache import get_embedding_cache
+from database.vector_index import get_vector_index
+from services.embedding_batcher import batcher_stats
+from services.answer_cache import get_answer_cache, get_stream_answer_cache
+from services.product_catalogue import get_product_catalogue
+from services.related_questions import get_related_question_cache
+from services.admission import admission_stats
+from controllers.search_controller import ai_response_flight
+from controllers.stream_controller import stream_flight
+
+
+register_collector(stats_collector("embedding_cache", lambda: get_embedding_cache().stats()))
+register_collector(stats_collector(
+    "answer_cache", lambda: get_answer_cache().stats(),
+    counters=("hits", "misses", "evictions", "expirations", "invalidations")
+))
+register_collector(stats_collector(
+    "stream_answer_cache", lambda: get_stream_answer_cache().stats(),
+    counters=("hits", "misses", "evictions", "expirations", "invalidations")
+))
+register_collector(stats_collector("embedding_batcher", batcher_stats, counters=("requests", "batches")))
+register_collector(stats_collector("ai_response_singleflight", ai_response_flight.stats, counters=("leaders", "joined")))
+register_collector(stats_collector("ai_stream_singleflight", stream_flight.stats, counters=("leaders", "joined")))
+register_collector(stats_collector(
+    "product_catalogue", lambda: get_product_catalogue().stats(), counters=("matched", "ambiguous")
+))
+register_collector(stats_collector(
+    "related_question_cache", lambda: get_related_question_cache().stats(),
+    counters=("precomputed", "hits", "misses", "evictions")
+))
+register_collector(stats_collector(
+    "admission", admission_stats, counters=("admitted", "queued", "rejected", "expired", "throttled")
+))
+register_collector(stats_collector(
+    "vector_index", lambda: get_vector_index().stats() if get_vector_index() is not None else {},
+    counters=("searches", "appends", "rebuilds")
+))
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    body = render_metrics()
+    pool = getattr(request.app.state, "db_pool", None)
+    if pool is not None:
+        body += (
+            "# TYPE db_pool_size gauge\n"
+            f"db_pool_size {pool.get_size()}\n"
+            "# TYPE db_pool_idle gauge\n"
+            f"db_pool_idle {pool.get_idle_size()}\n"
+        )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
@@ -1,45 +1,75 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 import asyncpg
 from models.search import *
 from controllers.search_controller import SearchController
 from controllers.stream_controller import StreamController
 from database.connection import get_db
+from services.openai_client import get_openai_client
+from services.admission import admission_priority, PRIORITY_STREAM, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from openai import AsyncOpenAI
 from fastapi.responses import StreamingResponse
-from database.queries import perform_similarity_search
 
 
 router = APIRouter()
 
-@router.post("/blog/similar", response_model=SearchResponse)
+@router.post("/blog/similar", response_model=SearchResponse, dependencies=[Depends(admission_priority(PRIORITY_INTERACTIVE))])
 async def find_similar(
     query_data: Query,
-    db: asyncpg.Connection = Depends(get_db)
+    db: asyncpg.Connection = Depends(get_db),
+    client: AsyncOpenAI = Depends(get_openai_client)
 ):
-    context = await SearchController.find_similar(query_data.query, db)
+    context = await SearchController.find_similar(query_data.query, db, client)
     return SearchResponse(
         message="Similar blogs found",
         results=context
     )
 
-@router.post("/blog/ai-response")
+@router.post("/blog/similar/batch", response_model=BatchSearchResponse, dependencies=[Depends(admission_priority(PRIORITY_BACKGROUND))])
+async def find_similar_batch(
+    query_data: BatchQuery,
+    db: asyncpg.Connection = Depends(get_db),
+    client: AsyncOpenAI = Depends(get_openai_client)
+):
+    results = await SearchController.find_similar_batch(query_data.queries, query_data.limit, db, client)
+    return BatchSearchResponse(
+        message="Similar blogs found",
+        results=results
+    )
+
+@router.post("/blog/similar/batch/stream", dependencies=[Depends(admission_priority(PRIORITY_BACKGROUND))])
+async def stream_similar_batch(
+    query_data: BatchQuery,
+    request: Request,
+    client: AsyncOpenAI = Depends(get_openai_client)
+):
+    # The generator leases its own connection: get_db is released before the body streams
+    return StreamingResponse(
+        SearchController.stream_similar_batch(
+            query_data.queries, query_data.limit, request.app.state.db_pool, client
+        ),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+@router.post("/blog/ai-response", dependencies=[Depends(admission_priority(PRIORITY_INTERACTIVE))])
 async def generate_ai_response(
     query_data: Query,
-    db: asyncpg.Connection = Depends(get_db)
+    request: Request,
+    client: AsyncOpenAI = Depends(get_openai_client)
 ):
-    return await SearchController.generate_ai_response(query_data.query, db)
+    # The shared flight leases its own connection (see SearchController.generate_ai_response)
+    return await SearchController.generate_ai_response(query_data.query, request.app.state.db_pool, client)
 
-@router.post("/blog/ai-streaming-response")
+@router.post("/blog/ai-streaming-response", dependencies=[Depends(admission_priority(PRIORITY_STREAM))])
 async def generate_ai_streaming_response(
     query_data: Query,
-    db: asyncpg.Connection = Depends(get_db)
+    request: Request,
+    client: AsyncOpenAI = Depends(get_openai_client)
 ):
-    # Do all DB/embedding work here
-    query_embedding = await StreamController.generate_embedding(query_data.query)
-    vector_string = f"[{','.join(map(str, query_embedding))}]"
-    context = await perform_similarity_search(db, vector_string, 5)
+    # Retrieval runs inside the stream so headers and a progress event flush immediately
     return StreamingResponse(
-        StreamController.openai_stream(query_data.query, context),
-        media_type="text/markdown",
+        StreamController.sse_stream(query_data.query, request, request.app.state.db_pool, client),
+        media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
@@ -47,19 +77,22 @@ async def generate_ai_streaming_response(
         }
     )
 
-@router.post("/blog/related-question", response_model=RelatedQuestionResponse)
+@router.post("/blog/related-question", response_model=RelatedQuestionResponse, dependencies=[Depends(admission_priority(PRIORITY_BACKGROUND))])
 async def generate_related_question(
-    request: RelatedQuestionRequest
+    request: RelatedQuestionRequest,
+    db: asyncpg.Connection = Depends(get_db),
+    client: AsyncOpenAI = Depends(get_openai_client)
 ):
-    related_questions = await SearchController.generate_related_question(request.question, request.context)
+    related_questions = await SearchController.generate_related_question(request.question, db, client, request.context)
     return RelatedQuestionResponse(related_questions=related_questions)
 
-@router.post("/blog/recommend-product-blog", response_model=RecommendProductBlogResponse)
+@router.post("/blog/recommend-product-blog", response_model=RecommendProductBlogResponse, dependencies=[Depends(admission_priority(PRIORITY_BACKGROUND))])
 async def recommend_product_blog(
     request: RecommendProductBlogRequest,
-    db: asyncpg.Connection = Depends(get_db)
+    db: asyncpg.Connection = Depends(get_db),
+    client: AsyncOpenAI = Depends(get_openai_client)
 ):
-    result = await SearchController.recommend_product_blog(request.query, request.context, db)
+    result = await SearchController.recommend_product_blog(request.query, request.context, db, client)
     return RecommendProductBlogResponse(**result)
 
 
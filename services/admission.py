@@ -0,0 +1,290 @@
+"""Admission control for upstream OpenAI calls.
+
+Every embeddings and chat-completion call goes through ``admit(model)``,
+which takes a per-model concurrency slot and draws on per-model request
+and token buckets. A call that cannot start right away waits in a
+bounded priority queue (streaming before interactive before background)
+for at most ``max_wait`` seconds. Calls that would overflow the queue or
+miss the deadline raise ``Overloaded`` straight away, as do upstream 429s
+(which also pause the model's bucket for Retry-After), so controllers can
+degrade or answer 429 instead of piling requests onto a throttled API.
+
+Limits come from ADMISSION_* environment variables, with per-model
+overrides in ADMISSION_MODEL_LIMITS, e.g.
+``{"text-embedding-3-small": {"max_concurrency": 64, "rps": 50, "tpm": 1000000}}``.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import openai
+from fastapi import HTTPException
+
+from services.context_packer import estimate_tokens
+
+T = TypeVar("T")
+
+PRIORITY_STREAM = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BACKGROUND = 2
+
+_priority: ContextVar[int] = ContextVar("admission_priority", default=PRIORITY_INTERACTIVE)
+
+
+class Overloaded(Exception):
+    def __init__(self, model: str, retry_after: float, reason: str):
+        super().__init__(f"{model} is overloaded ({reason}); retry after {retry_after:.1f}s")
+        self.model = model
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    """``rate`` units per second, bursting up to ``capacity``; a rate of 0 disables the limit."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)  # an oversized request waits for a full bucket
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("priority", "tokens", "future")
+
+    def __init__(self, priority: int, tokens: float, future: asyncio.Future):
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+
+
+class ModelGate:
+    def __init__(self, model: str, max_concurrency: int = 32, rps: float = 0.0, tpm: float = 0.0,
+                 max_queue: int = 100, max_wait: float = 5.0):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.requests = TokenBucket(rps, max(1.0, rps))
+        self.token_bucket = TokenBucket(tpm / 60.0, tpm / 6.0)  # ten seconds of burst
+        self.paused_until = 0.0
+        self.active = 0
+        self._waiting: List[tuple] = []
+        self.waiting = 0  # live waiters; _waiting also holds expired and cancelled ones until popped
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.expired = 0
+        self.throttled = 0
+
+    def _delay(self, tokens: float) -> float:
+        return max(
+            self.paused_until - time.monotonic(),
+            self.requests.delay(1),
+            self.token_bucket.delay(tokens),
+        )
+
+    def _grant(self, tokens: float) -> None:
+        self.requests.take(1)
+        self.token_bucket.take(tokens)
+        self.active += 1
+        self.admitted += 1
+
+    def retry_after(self, tokens: float = 0.0) -> float:
+        return max(1.0, self._delay(tokens))
+
+    async def acquire(self, priority: int, tokens: float = 0.0) -> None:
+        if not self._waiting and self.active < self.max_concurrency and self._delay(tokens) <= 0:
+            self._grant(tokens)
+            return
+        # Background work is shed once the queue is half full, keeping room for streams
+        limit = self.max_queue if priority < PRIORITY_BACKGROUND else self.max_queue // 2
+        if self.waiting >= limit:
+            self.rejected += 1
+            raise Overloaded(self.model, self.retry_after(tokens), "queue full")
+        if len(self._waiting) > 2 * max(self.max_queue, 1):
+            # Drop dead entries that _dispatch has not reached while saturated
+            self._waiting = [entry for entry in self._waiting if not entry[2].future.done()]
+            heapq.heapify(self._waiting)
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, tokens, loop.create_future())
+        heapq.heappush(self._waiting, (priority, next(self._sequence), waiter))
+        self.waiting += 1
+        self.queued += 1
+        deadline = loop.call_later(self.max_wait, self._expire, waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.cancelled():
+                self.waiting -= 1
+            elif waiter.future.done() and waiter.future.exception() is None:
+                self.release()  # granted just as the caller went away
+            # Otherwise the deadline expired first: no slot was taken
+            raise
+        finally:
+            deadline.cancel()
+
+    def _expire(self, waiter: _Waiter) -> None:
+        if not waiter.future.done():
+            self.waiting -= 1
+            self.expired += 1
+            waiter.future.set_exception(Overloaded(self.model, self.retry_after(waiter.tokens), "queue wait deadline"))
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def pause(self, seconds: float) -> None:
+        """Upstream asked us to back off: hold every queued call for ``seconds``."""
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiting and self.active < self.max_concurrency:
+            waiter = self._waiting[0][2]
+            if waiter.future.done():
+                heapq.heappop(self._waiting)
+                continue
+            delay = self._delay(waiter.tokens)
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiting)
+            self.waiting -= 1
+            self._grant(waiter.tokens)
+            waiter.future.set_result(None)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "throttled": self.throttled,
+        }
+
+
+_gates: Dict[str, ModelGate] = {}
+
+
+def get_gate(model: str) -> ModelGate:
+    gate = _gates.get(model)
+    if gate is None:
+        settings = {
+            "max_concurrency": int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32")),
+            "rps": float(os.getenv("ADMISSION_RPS", "0")),
+            "tpm": float(os.getenv("ADMISSION_TPM", "0")),
+            "max_queue": int(os.getenv("ADMISSION_MAX_QUEUE", "100")),
+            "max_wait": float(os.getenv("ADMISSION_MAX_WAIT", "5")),
+        }
+        settings.update(json.loads(os.getenv("ADMISSION_MODEL_LIMITS", "{}")).get(model, {}))
+        gate = _gates[model] = ModelGate(model, **settings)
+    return gate
+
+
+def _upstream_retry_after(error: openai.RateLimitError) -> float:
+    headers = error.response.headers
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    if headers.get("retry-after", "").isdigit():
+        return float(headers["retry-after"])
+    return 1.0
+
+
+@asynccontextmanager
+async def admit(model: str, tokens: float = 0.0, priority: Optional[int] = None) -> AsyncIterator[None]:
+    """Hold one of ``model``'s upstream slots for the duration of the block."""
+    gate = get_gate(model)
+    await gate.acquire(_priority.get() if priority is None else priority, tokens)
+    try:
+        yield
+    except openai.RateLimitError as e:
+        retry_after = _upstream_retry_after(e)
+        gate.pause(retry_after)
+        raise Overloaded(model, retry_after, "upstream rate limit") from e
+    finally:
+        gate.release()
+
+
+async def admitted(model: str, fn: Callable[[], Awaitable[T]], tokens: float = 0.0) -> T:
+    async with admit(model, tokens):
+        return await fn()
+
+
+def chat_tokens(messages: List[dict], max_tokens: int) -> int:
+    """Token-bucket cost of a chat completion: estimated prompt plus the completion budget."""
+    return sum(estimate_tokens(str(m.get("content", ""))) for m in messages) + max_tokens
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def admission_priority(priority: int) -> Callable[[], Awaitable[None]]:
+    """Route dependency tagging every upstream call of the request with ``priority``."""
+    async def dependency() -> None:
+        # async so the value is set in the request's own context
+        _priority.set(priority)
+    return dependency
+
+
+def overloaded_cause(error: BaseException) -> Optional[Overloaded]:
+    """The Overloaded behind ``error``, looking through StageError and exception chaining."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, Overloaded):
+            return error
+        seen.add(id(error))
+        error = getattr(error, "error", None) or error.__cause__
+    return None
+
+
+def raise_if_overloaded(error: BaseException) -> None:
+    overloaded = overloaded_cause(error)
+    if overloaded is not None:
+        raise HTTPException(
+            status_code=429,
+            detail=str(overloaded),
+            headers={"Retry-After": str(math.ceil(overloaded.retry_after))},
+        ) from error
+
+
+def admission_stats() -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for gate in _gates.values():
+        for key, value in gate.stats().items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def admission_stats_by_model() -> Dict[str, Dict[str, float]]:
+    return {model: gate.stats() for model, gate in _gates.items()}
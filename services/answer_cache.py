@@ -0,0 +1,147 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("documentids", "answer", "stored_at")
+
+    def __init__(self, documentids: FrozenSet[str], answer: str, stored_at: float):
+        self.documentids = documentids
+        self.answer = answer
+        self.stored_at = stored_at
+
+
+class SemanticAnswerCache:
+    """Answers keyed by query embedding and the set of retrieved documents.
+
+    A lookup hits when a cached query lies within ``max_distance`` cosine
+    distance of the new one and retrieval returned the same ``documentid``
+    set. Normalised embeddings live in a fixed ``max_entries`` x dim float32
+    matrix, so a lookup is one matrix-vector product; slots are recycled in
+    LRU order.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0, max_distance: float = 0.05):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._matrix: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls, prefix: str = "ANSWER_CACHE") -> "SemanticAnswerCache":
+        return cls(
+            max_entries=int(os.getenv(f"{prefix}_SIZE", "1000")),
+            ttl=float(os.getenv(f"{prefix}_TTL", "3600")),
+            max_distance=float(os.getenv(f"{prefix}_MAX_DISTANCE", "0.05")),
+        )
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding: Sequence[float], documentids: Iterable[str]) -> Optional[str]:
+        if self._matrix is None or not self._entries:
+            self.misses += 1
+            return None
+        query = self._normalize(embedding)
+        if query.shape[0] != self._matrix.shape[1]:
+            self.misses += 1
+            return None
+        distances = 1.0 - self._matrix @ query
+        candidates = np.nonzero(self._valid & (distances <= self.max_distance))[0]
+        wanted = frozenset(documentids)
+        now = time.monotonic()
+        for slot in candidates[np.argsort(distances[candidates])]:
+            slot = int(slot)
+            entry = self._entries[slot]
+            if now - entry.stored_at > self.ttl:
+                self._release(slot)
+                self.expirations += 1
+                continue
+            if entry.documentids == wanted:
+                self._entries.move_to_end(slot)
+                self.hits += 1
+                return entry.answer
+        self.misses += 1
+        return None
+
+    def put(self, embedding: Sequence[float], documentids: Iterable[str], answer: str) -> None:
+        vector = self._normalize(embedding)
+        if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+            self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            self.clear()
+        if not self._free:
+            slot, _ = self._entries.popitem(last=False)
+            self._valid[slot] = False
+            self._free.append(slot)
+            self.evictions += 1
+        slot = self._free.pop()
+        self._matrix[slot] = vector
+        self._valid[slot] = True
+        self._entries[slot] = _Entry(frozenset(documentids), answer, time.monotonic())
+
+    def _release(self, slot: int) -> None:
+        del self._entries[slot]
+        self._valid[slot] = False
+        self._free.append(slot)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._valid[:] = False
+        self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def invalidate(self) -> None:
+        """Drop every answer, e.g. after blog_embedding_oai_small changes."""
+        if self._entries:
+            logger.info(f"Invalidating {len(self._entries)} cached answers")
+        self.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_answer_caches: Dict[str, SemanticAnswerCache] = {}
+
+
+def get_answer_cache(prefix: str = "ANSWER_CACHE") -> SemanticAnswerCache:
+    cache = _answer_caches.get(prefix)
+    if cache is None:
+        cache = _answer_caches[prefix] = SemanticAnswerCache.from_env(prefix)
+    return cache
+
+
+def get_stream_answer_cache() -> SemanticAnswerCache:
+    return get_answer_cache("STREAM_ANSWER_CACHE")
+
+
+def invalidate_answer_caches() -> None:
+    for cache in _answer_caches.values():
+        cache.invalidate()
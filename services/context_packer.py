@@ -0,0 +1,54 @@
+import os
+from typing import List, Optional
+
+from models.search import Context
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap tokenizer stand-in: ~4 characters per token for English BPE vocabularies."""
+    return (len(text) + 3) // 4
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + " …"
+
+
+def pack_context(context: List[Context], token_budget: Optional[int] = None,
+                 max_distance: Optional[float] = None) -> str:
+    """Render retrieved chunks as a compact, token-bounded prompt section.
+
+    ``Context.similarity`` holds pgvector cosine *distance*, so chunks above
+    ``max_distance`` are the ones below the similarity cutoff and are
+    dropped. Only the best-ranked chunk per ``documentid`` is kept, and
+    chunks are added in rank order until ``token_budget`` is spent, the
+    last one truncated at a word boundary.
+    """
+    if token_budget is None:
+        token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+    if max_distance is None:
+        max_distance = float(os.getenv("CONTEXT_MAX_DISTANCE", "0.8"))
+
+    seen = set()
+    sections = []
+    remaining = token_budget
+    for chunk in sorted(context, key=lambda c: c.similarity):
+        if chunk.similarity > max_distance or chunk.documentid in seen:
+            continue
+        seen.add(chunk.documentid)
+        header = f"[{chunk.documentid}]\n"
+        available = remaining - estimate_tokens(header)
+        if available <= 0:
+            break
+        content = _truncate(" ".join(chunk.content.split()), available)
+        sections.append(header + content)
+        remaining -= estimate_tokens(header) + estimate_tokens(content)
+    return "\n\n".join(sections)
+
+
+def build_user_message(query: str, context: List[Context]) -> str:
+    packed = pack_context(context)
+    return f"Question: {query}\n\nContext:\n{packed or '(no relevant blog content found)'}"
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+import weakref
+from typing import Dict, List, Optional, Set, Tuple
+
+from openai import AsyncOpenAI
+
+from services.admission import admit, current_priority
+from services.context_packer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Coalesce embedding requests from concurrent coroutines into one API call.
+
+    Queries queue up until either ``max_batch_size`` are waiting or
+    ``max_wait`` seconds have passed since the first one arrived; the batch
+    is then sent as a single ``embeddings.create`` call and each caller's
+    future is resolved with its own vector. The call is admitted at the
+    most urgent priority among the callers, since the timer or task that
+    sends it runs in whichever context opened the batch.
+    """
+
+    def __init__(self, client: AsyncOpenAI, max_batch_size: int = 64, max_wait: float = 0.005):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future, int]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.requests = 0
+        self.batches = 0
+
+    async def embed(self, text: str, model: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(model, [])
+        pending.append((text, future, current_priority()))
+        self.requests += 1
+        if len(pending) >= self.max_batch_size:
+            self._flush(model)
+        elif model not in self._timers:
+            self._timers[model] = loop.call_later(self.max_wait, self._flush, model)
+        return await future
+
+    def _flush(self, model: str) -> None:
+        timer = self._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(model, [])
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._send(batch, model))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future, int]], model: str) -> None:
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        priority = min(p for _, _, p in batch)
+        self.batches += 1
+        try:
+            async with admit(model, sum(estimate_tokens(t) for t in texts), priority):
+                response = await self.client.embeddings.create(input=texts, model=model)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        vectors = {texts[item.index]: item.embedding for item in response.data}
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(vectors[text])
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
+
+
+_batchers: "weakref.WeakKeyDictionary[AsyncOpenAI, EmbeddingBatcher]" = weakref.WeakKeyDictionary()
+
+
+def get_embedding_batcher(client: AsyncOpenAI) -> EmbeddingBatcher:
+    batcher: Optional[EmbeddingBatcher] = _batchers.get(client)
+    if batcher is None:
+        batcher = EmbeddingBatcher(
+            client,
+            max_batch_size=int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64")),
+            max_wait=float(os.getenv("EMBEDDING_BATCH_MAX_WAIT", "0.005")),
+        )
+        _batchers[client] = batcher
+    return batcher
+
+
+def batcher_stats() -> Dict[str, float]:
+    requests = sum(b.requests for b in _batchers.values())
+    batches = sum(b.batches for b in _batchers.values())
+    return {
+        "requests": requests,
+        "batches": batches,
+        "avg_batch_size": requests / batches if batches else 0.0,
+    }
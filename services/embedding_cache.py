@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
+class SqliteEmbeddingStore:
+    """Persistent tier: float32 vectors in a local SQLite file that survives restarts.
+
+    Rows older than ``ttl`` are deleted when read, and every
+    ``prune_interval`` writes the table is cut back to ``max_rows`` (oldest
+    first) along with any other expired rows.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400.0, max_rows: int = 100000, prune_interval: int = 1000):
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.prune_interval = prune_interval
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT NOT NULL, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL,"
+            " PRIMARY KEY (key, model))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+        self._conn.commit()
+
+    def get(self, key: str, model: str) -> Optional[Tuple[array, float]]:
+        """The vector and its age in seconds, or None if missing or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector, created_at FROM embeddings WHERE key = ? AND model = ?", (key, model)
+            ).fetchone()
+            if row is None:
+                return None
+            age = time.time() - row[1]
+            if age > self.ttl:
+                self._conn.execute("DELETE FROM embeddings WHERE key = ? AND model = ?", (key, model))
+                self._conn.commit()
+                return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector, age
+
+    def put(self, key: str, model: str, vector: array) -> int:
+        """Store ``vector``; returns the number of rows pruned to make room."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, vector.tobytes(), time.time()),
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % self.prune_interval:
+                return 0
+            return self._prune()
+
+    def prune(self) -> int:
+        with self._lock:
+            return self._prune()
+
+    def _prune(self) -> int:
+        expired = self._conn.execute(
+            "DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl,)
+        ).rowcount
+        overflow = self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN ("
+            " SELECT rowid FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        ).rowcount
+        self._conn.commit()
+        return expired + overflow
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """Size-bounded LRU of query embeddings with a TTL and an optional SQLite tier.
+
+    Vectors are held as float32 arrays, roughly a tenth of the memory of a
+    list of Python floats.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 86400.0,
+                 store: Optional[SqliteEmbeddingStore] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.store = store
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, array]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        path = os.getenv("EMBEDDING_CACHE_PATH")
+        ttl = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+        store = None
+        if path:
+            store = SqliteEmbeddingStore(path, ttl, int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "100000")))
+        cache = cls(max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")), ttl=ttl, store=store)
+        if store is not None:
+            cache.evictions += store.prune()
+        return cache
+
+    async def get(self, query: str, model: str) -> Optional[List[float]]:
+        key = (normalize_query(query), model)
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, vector = entry
+            if time.monotonic() - stored_at <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+            del self._entries[key]
+        if self.store is not None:
+            stored = await asyncio.to_thread(self.store.get, *key)
+            if stored is not None:
+                vector, age = stored
+                self.disk_hits += 1
+                # Keep the original expiry rather than restarting the TTL
+                self._insert(key, vector, time.monotonic() - age)
+                return vector.tolist()
+        self.misses += 1
+        return None
+
+    async def put(self, query: str, model: str, embedding: List[float]) -> None:
+        key = (normalize_query(query), model)
+        vector = array("f", embedding)
+        self._insert(key, vector)
+        if self.store is not None:
+            try:
+                self.evictions += await asyncio.to_thread(self.store.put, key[0], key[1], vector)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not persist embedding: {e}")
+
+    def _insert(self, key: Tuple[str, str], vector: array, stored_at: Optional[float] = None) -> None:
+        self._entries[key] = (time.monotonic() if stored_at is None else stored_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache.from_env()
+    return _embedding_cache
+
+
+def close_embedding_cache() -> None:
+    global _embedding_cache
+    if _embedding_cache is not None:
+        _embedding_cache.close()
+        _embedding_cache = None
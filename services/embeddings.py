@@ -0,0 +1,40 @@
+import os
+from typing import List, Optional
+
+from openai import AsyncOpenAI
+
+from services.admission import admit
+from services.context_packer import estimate_tokens
+from services.embedding_batcher import get_embedding_batcher
+from services.embedding_cache import get_embedding_cache
+
+
+def embedding_model() -> str:
+    return os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+
+async def embed_query(query: str, client: AsyncOpenAI) -> List[float]:
+    model = embedding_model()
+    cache = get_embedding_cache()
+    cached = await cache.get(query, model)
+    if cached is not None:
+        return cached
+    embedding = await get_embedding_batcher(client).embed(query, model)
+    await cache.put(query, model, embedding)
+    return embedding
+
+
+async def embed_queries(queries: List[str], client: AsyncOpenAI) -> List[List[float]]:
+    """Embed many queries; cache misses go upstream in a single embeddings call."""
+    model = embedding_model()
+    cache = get_embedding_cache()
+    embeddings: List[Optional[List[float]]] = [await cache.get(q, model) for q in queries]
+    missing = list(dict.fromkeys(q for q, e in zip(queries, embeddings) if e is None))
+    if missing:
+        async with admit(model, sum(estimate_tokens(q) for q in missing)):
+            response = await client.embeddings.create(input=missing, model=model)
+        fetched = {missing[item.index]: item.embedding for item in response.data}
+        for text, embedding in fetched.items():
+            await cache.put(text, model, embedding)
+        embeddings = [e if e is not None else fetched[q] for q, e in zip(queries, embeddings)]
+    return embeddings
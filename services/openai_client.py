@@ -0,0 +1,39 @@
+import os
+import logging
+
+import httpx
+from fastapi import Request
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+logger = logging.getLogger(__name__)
+
+
+def create_openai_client() -> AsyncOpenAI:
+    """Build the process-wide client; one keep-alive connection pool for every request."""
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30")),
+        ),
+        timeout=httpx.Timeout(
+            float(os.getenv("OPENAI_TIMEOUT", "60")),
+            connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")),
+        ),
+    )
+    client = AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=http_client,
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+    )
+    logger.info("OpenAI client created")
+    return client
+
+
+async def close_openai_client(client: AsyncOpenAI) -> None:
+    await client.close()
+    logger.info("OpenAI client closed")
+
+
+def get_openai_client(request: Request) -> AsyncOpenAI:
+    return request.app.state.openai_client
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.metrics import record_stage
+
+
+class StageError(Exception):
+    def __init__(self, stage: str, error):
+        super().__init__(f"{stage} stage failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class StageTimeout(StageError):
+    pass
+
+
+class Stage:
+    """A named unit of pipeline work with its own timeout."""
+
+    def __init__(self, name: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None):
+        self.name = name
+        self.fn = fn
+        self.timeout = timeout
+
+
+def stage_timeout(name: str, default: float) -> float:
+    return float(os.getenv(f"PIPELINE_{name.upper()}_TIMEOUT", str(default)))
+
+
+async def run_stage(stage: Stage) -> Any:
+    started = time.perf_counter()
+    try:
+        return await asyncio.wait_for(stage.fn(), stage.timeout)
+    except asyncio.TimeoutError:
+        raise StageTimeout(stage.name, f"timed out after {stage.timeout}s")
+    except StageError:
+        raise
+    except Exception as e:
+        raise StageError(stage.name, e) from e
+    finally:
+        record_stage(stage.name, time.perf_counter() - started)
+
+
+async def run_concurrently(*stages: Stage) -> Dict[str, Any]:
+    """Run independent stages together and return their results by name.
+
+    Latency is that of the slowest stage. The first failure cancels the
+    remaining siblings and is re-raised as a StageError.
+    """
+    tasks = {asyncio.ensure_future(run_stage(stage)): stage.name for stage in stages}
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+        return {name: task.result() for task, name in tasks.items()}
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from services.embeddings import embed_queries
+
+logger = logging.getLogger(__name__)
+
+
+class ProductCatalogue:
+    """Products from a JSON catalogue, embedded once and matched by cosine similarity.
+
+    ``match`` scores every product with one matrix-vector product, ranks
+    categories by the mean of their two best product scores and returns
+    the best products of the winning category. It returns None when the
+    match is ambiguous (best score below ``min_score``, or the runner-up
+    category within ``min_margin``) so the caller can fall back to the LLM.
+    """
+
+    def __init__(self, categories: List[dict], products: List[dict], top_k: int = 3,
+                 min_score: float = 0.3, min_margin: float = 0.03):
+        self.categories = categories
+        self.products = products
+        self.top_k = top_k
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self._category_of = np.asarray([
+            [c["name"] for c in categories].index(p["category"]) for p in products
+        ])
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = asyncio.Lock()
+        self.matched = 0
+        self.ambiguous = 0
+
+    @classmethod
+    def from_env(cls) -> "ProductCatalogue":
+        with open(os.getenv("PRODUCT_CATALOGUE_PATH", "data/products.json")) as f:
+            data = json.load(f)
+        return cls(
+            data["categories"],
+            data["products"],
+            top_k=int(os.getenv("PRODUCT_MATCH_TOP_K", "3")),
+            min_score=float(os.getenv("PRODUCT_MATCH_MIN_SCORE", "0.3")),
+            min_margin=float(os.getenv("PRODUCT_MATCH_MIN_MARGIN", "0.03")),
+        )
+
+    def document(self, product: dict) -> str:
+        return f"{product['category']}: {product['name']}. {product['description']}"
+
+    def render(self) -> str:
+        """The catalogue as prompt text for the LLM fallback."""
+        lines = ["Here are the available product categories and their typical applications:"]
+        for category in self.categories:
+            lines.append("")
+            lines.append(f"**{category['name']}** (used for {category['applications']}):")
+            lines.extend(
+                f"- {p['name']}: {p['description']}" for p in self.products if p["category"] == category["name"]
+            )
+        return "\n".join(lines)
+
+    async def load(self, client: AsyncOpenAI) -> None:
+        """Embed the product documents; the embedding cache keeps them across restarts."""
+        async with self._lock:
+            if self._matrix is not None:
+                return
+            vectors = await embed_queries([self.document(p) for p in self.products], client)
+            matrix = np.asarray([np.asarray(v, dtype=np.float32) for v in vectors], dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._matrix = matrix
+            logger.info(f"Product catalogue embedded: {len(self.products)} products")
+
+    def _rank(self, embedding: Sequence[float]) -> Tuple[List[str], bool]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        scores = self._matrix @ (vector / np.linalg.norm(vector))
+        category_scores = np.full(len(self.categories), -1.0)
+        for index in range(len(self.categories)):
+            best = np.sort(scores[self._category_of == index])[::-1][:2]
+            if len(best):
+                category_scores[index] = best.mean()
+        ranked = np.argsort(category_scores)[::-1]
+        margin = category_scores[ranked[0]] - category_scores[ranked[1]] if len(ranked) > 1 else 1.0
+        members = np.flatnonzero(self._category_of == ranked[0])
+        best = members[np.argsort(scores[members])[::-1][:self.top_k]]
+        ambiguous = bool(scores.max() < self.min_score or margin < self.min_margin)
+        return [self.products[i]["name"] for i in best], ambiguous
+
+    def match(self, embedding: Sequence[float]) -> Optional[List[str]]:
+        names, ambiguous = self._rank(embedding)
+        if ambiguous:
+            self.ambiguous += 1
+            return None
+        self.matched += 1
+        return names
+
+    def best_guess(self, embedding: Sequence[float]) -> List[str]:
+        """The top products even when the match is ambiguous; used when the LLM is unavailable."""
+        return self._rank(embedding)[0]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "products": len(self.products),
+            "loaded": int(self._matrix is not None),
+            "matched": self.matched,
+            "ambiguous": self.ambiguous,
+        }
+
+
+_catalogue: Optional[ProductCatalogue] = None
+
+
+def get_product_catalogue() -> ProductCatalogue:
+    global _catalogue
+    if _catalogue is None:
+        _catalogue = ProductCatalogue.from_env()
+    return _catalogue
+
+
+async def warm_product_catalogue(client: AsyncOpenAI) -> None:
+    """Embed the catalogue at startup; a failure only defers it to the first request."""
+    try:
+        await get_product_catalogue().load(client)
+    except Exception as e:
+        logger.warning(f"Product catalogue not embedded at startup: {str(e)}")
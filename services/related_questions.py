@@ -0,0 +1,112 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from services.embedding_cache import normalize_query
+
+QUESTION_SYSTEM_PROMPT = (
+    "You are an AI assistant. Given a user's question, generate a list of 5 highly relevant, natural-sounding follow-up or related questions that would help deepen the conversation or clarify the topic. "
+    "Do not answer the original question, just return a numbered or bulleted list of 5 related questions."
+)
+
+DOCUMENT_SYSTEM_PROMPT = (
+    "You are an AI assistant. Given a blog article, generate a list of 5 highly relevant, natural-sounding questions that a reader of this article would ask next. "
+    "Do not answer them, just return a numbered or bulleted list of 5 questions."
+)
+
+
+def question_messages(question: str, context: Optional[str] = None) -> List[dict]:
+    user_content = f"Original question: {question}"
+    if context:
+        user_content += f"\n\nContext: {context}"
+    return [
+        {"role": "system", "content": QUESTION_SYSTEM_PROMPT},
+        {"role": "user", "content": user_content}
+    ]
+
+
+def document_messages(content: str) -> List[dict]:
+    return [
+        {"role": "system", "content": DOCUMENT_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Article: {content}"}
+    ]
+
+
+def parse_questions(content: str) -> List[str]:
+    lines = [line.strip("- ").strip() for line in content.splitlines() if line.strip() and (line.strip()[0].isdigit() or line.strip().startswith("-"))]
+    if not lines:
+        lines = [l.strip() for l in content.split("\n") if l.strip()]
+    return lines
+
+
+class RelatedQuestionCache:
+    """Size-bounded LRU of LLM-generated related questions, keyed on (question, context hash).
+
+    ``precomputed`` counts requests answered from blog_related_questions,
+    so ``hit_ratio`` covers every request that skipped the LLM.
+    """
+
+    def __init__(self, max_size: int = 5000, ttl: float = 86400.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[str]]]" = OrderedDict()
+        self.precomputed = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "RelatedQuestionCache":
+        return cls(
+            max_size=int(os.getenv("RELATED_QUESTION_CACHE_SIZE", "5000")),
+            ttl=float(os.getenv("RELATED_QUESTION_CACHE_TTL", "86400")),
+        )
+
+    @staticmethod
+    def key(question: str, context: Optional[str]) -> Tuple[str, str]:
+        return normalize_query(question), hashlib.sha1((context or "").encode("utf-8")).hexdigest()
+
+    def get(self, question: str, context: Optional[str]) -> Optional[List[str]]:
+        key = self.key(question, context)
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, questions = entry
+            if time.monotonic() - stored_at <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(questions)
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, question: str, context: Optional[str], questions: List[str]) -> None:
+        key = self.key(question, context)
+        self._entries[key] = (time.monotonic(), list(questions))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        requests = self.precomputed + self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "precomputed": self.precomputed,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.precomputed + self.hits) / requests if requests else 0.0,
+        }
+
+
+_related_question_cache: Optional[RelatedQuestionCache] = None
+
+
+def get_related_question_cache() -> RelatedQuestionCache:
+    global _related_question_cache
+    if _related_question_cache is None:
+        _related_question_cache = RelatedQuestionCache.from_env()
+    return _related_question_cache
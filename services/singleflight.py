@@ -0,0 +1,124 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Run at most one coroutine per key; concurrent callers share its result."""
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.joined = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            task = self._flights.get(key)
+            if task is None:
+                task = asyncio.ensure_future(fn())
+                self._flights[key] = task
+                task.add_done_callback(lambda t: self._forget(key, t))
+                self.leaders += 1
+                # The leader owns the work: if it is cancelled, so is the task.
+                return await task
+            self.joined += 1
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+                # The leader went away mid-flight; retry, possibly as leader.
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "joined": self.joined}
+
+
+class _Broadcast:
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class StreamSingleFlight:
+    """Share one upstream async stream between concurrent identical requests.
+
+    Late joiners first receive every chunk emitted so far, then follow the
+    live tail. The upstream stream is cancelled once its last subscriber
+    goes away.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Broadcast] = {}
+        self.leaders = 0
+        self.joined = 0
+
+    async def subscribe(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Broadcast()
+            self._flights[key] = flight
+            flight.task = asyncio.ensure_future(self._produce(key, flight, factory()))
+            self.leaders += 1
+        else:
+            self.joined += 1
+        flight.subscribers += 1
+        position = 0
+        try:
+            while True:
+                changed = flight.changed
+                if position < len(flight.chunks):
+                    chunk = flight.chunks[position]
+                    position += 1
+                    yield chunk
+                    continue
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task is not None:
+                # Forget it now: unwinding the upstream can take a while, and a
+                # request arriving meanwhile must start a fresh flight
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    async def _produce(self, key: str, flight: _Broadcast, stream: AsyncIterator[str]) -> None:
+        try:
+            async for chunk in stream:
+                flight.chunks.append(chunk)
+                flight.notify()
+        except asyncio.CancelledError:
+            # Anyone still following gets an error rather than a silently truncated stream
+            flight.error = RuntimeError("shared stream was cancelled")
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+            self._forget(key, flight)
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def _forget(self, key: str, flight: _Broadcast) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "joined": self.joined}
@@ -13,8 +13,9 @@ async def test_search():
 async def test_recommend_product():
     async with httpx.AsyncClient() as client:
         response = await client.post(
-            "http://localhost:52059/blog/recommend-product",
+            "http://localhost:52059/blog/recommend-product-blog",
             json={
+                "query": "kitchen cabinets",
                 "context": "I need a durable material for kitchen cabinets that can withstand moisture."
             }
         )
@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+
+from services.admission import ModelGate
+
+
+class ModelGateCancellationTest(unittest.IsolatedAsyncioTestCase):
+    async def queued(self, gate: ModelGate):
+        task = asyncio.ensure_future(gate.acquire(1))
+        await asyncio.sleep(0)
+        self.assertEqual(gate.waiting, 1)
+        return task, gate._waiting[0][2]
+
+    async def test_expire_then_cancel_keeps_slot_count(self):
+        gate = ModelGate("m", max_concurrency=1, max_wait=60)
+        await gate.acquire(1)
+        task, waiter = await self.queued(gate)
+
+        gate._expire(waiter)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertEqual(gate.active, 1)
+        self.assertEqual(gate.waiting, 0)
+
+    async def test_grant_then_cancel_returns_slot(self):
+        gate = ModelGate("m", max_concurrency=1, max_wait=60)
+        await gate.acquire(1)
+        task, _ = await self.queued(gate)
+
+        gate.release()  # hands the slot to the queued call
+        self.assertEqual(gate.active, 1)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertEqual(gate.active, 0)
+        self.assertEqual(gate.waiting, 0)
+
+    async def test_cancel_while_queued(self):
+        gate = ModelGate("m", max_concurrency=1, max_wait=60)
+        await gate.acquire(1)
+        task, _ = await self.queued(gate)
+
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertEqual(gate.active, 1)
+        self.assertEqual(gate.waiting, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from contextlib import asynccontextmanager
+
+from database.queries import iter_batch_similarity_search
+
+
+def row(ord: int, documentid: str, similarity: float) -> dict:
+    return {"ord": ord, "documentid": documentid, "content": documentid, "similarity": similarity}
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.prefetch = None
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def execute(self, sql: str) -> None:
+        pass
+
+    async def cursor(self, sql: str, *args, prefetch=None):
+        self.prefetch = prefetch
+        for item in self.rows:
+            yield item
+
+
+class IterBatchSimilaritySearchTest(unittest.IsolatedAsyncioTestCase):
+    async def search(self, conn: FakeConnection, queries: int, limit: int):
+        return [
+            (position, [hit.documentid for hit in hits])
+            async for position, hits in iter_batch_similarity_search(conn, [[0.0]] * queries, limit)
+        ]
+
+    async def test_groups_and_sorts_hits_per_query(self):
+        conn = FakeConnection([row(1, "a", 0.3), row(1, "b", 0.1), row(3, "c", 0.2)])
+        results = await self.search(conn, 4, 2)
+        self.assertEqual(results, [(0, ["b", "a"]), (1, []), (2, ["c"]), (3, [])])
+        self.assertEqual(conn.prefetch, 2)
+
+    async def test_out_of_order_rows_raise(self):
+        conn = FakeConnection([row(2, "a", 0.1), row(1, "b", 0.1)])
+        with self.assertRaises(RuntimeError):
+            await self.search(conn, 2, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+
+from services.singleflight import StreamSingleFlight
+
+
+async def upstream(chunks: int = 10):
+    try:
+        for i in range(chunks):
+            await asyncio.sleep(0.01)
+            yield f"chunk{i}"
+    finally:
+        # Like closing the OpenAI response: unwinding takes a while
+        await asyncio.sleep(0.05)
+
+
+class StreamSingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_joiner_shares_the_stream(self):
+        flight = StreamSingleFlight()
+
+        async def consume():
+            return [chunk async for chunk in flight.subscribe("q", upstream)]
+
+        first, second = await asyncio.gather(consume(), consume())
+        self.assertEqual(len(first), 10)
+        self.assertEqual(first, second)
+        self.assertEqual(flight.leaders, 1)
+
+    async def test_retry_after_cancel_starts_a_fresh_flight(self):
+        flight = StreamSingleFlight()
+        stream = flight.subscribe("q", upstream)
+        received = [await stream.__anext__() for _ in range(4)]
+        await stream.aclose()  # the client went away; the upstream is still unwinding
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+        retried = [chunk async for chunk in flight.subscribe("q", upstream)]
+        self.assertEqual(len(received), 4)
+        self.assertEqual(len(retried), 10)
+        self.assertEqual(flight.leaders, 2)
+
+    async def test_follower_of_a_cancelled_producer_raises(self):
+        flight = StreamSingleFlight()
+        stream = flight.subscribe("q", upstream)
+        await stream.__anext__()
+        flight._flights["q"].task.cancel()
+        with self.assertRaises(RuntimeError):
+            async for _ in stream:
+                pass
+
+
+if __name__ == "__main__":
+    unittest.main()